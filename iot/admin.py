@@ -7,4 +7,5 @@ admin.site.register(Modul)
 admin.site.register(DataModul)
 admin.site.register(ModulePin)
 admin.site.register(Feature)
-admin.site.register(ModuleLog)
\ No newline at end of file
+admin.site.register(ModuleLog)
+admin.site.register(SensorReading)
\ No newline at end of file
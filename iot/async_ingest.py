@@ -0,0 +1,160 @@
+"""
+Versi async-native dari iot.ingest untuk DeviceAuthConsumer (aktif jika IOT_INGEST_ASYNC=True).
+Menggunakan ORM async Django (aget, aexists, acreate, asave, abulk_update, abulk_create).
+
+Catatan:
+- ORM async tidak mendukung transaction.atomic(), jadi setiap key frame disimpan
+  secara terpisah (error tetap diisolasi per key).
+- Pada Django 5.2 method ORM async masih dijalankan lewat sync_to_async per query,
+  bandingkan kedua jalur dengan `python manage.py benchmark_ingest_paths`.
+"""
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from iot.models import Modul, ModulePin, ModuleLog, SensorReading, DataModul
+from iot.buffers import sensor_history, latest_data
+from iot.registry import feature_registry, pin_registry
+from iot.ingest import SENSOR_FEATURES, parse_pin_states, collect_batch_readings
+from iot.tasks import update_module_log
+
+logger = logging.getLogger(__name__)
+
+
+async def aget_modul(serial_id):
+    """Mengambil instance Modul berdasarkan serial_id, None jika tidak ada."""
+    try:
+        return await Modul.objects.aget(serial_id=serial_id)
+    except Modul.DoesNotExist:
+        return None
+
+
+async def ais_user_member_of_modul(modul: Modul, user):
+    """Mengecek apakah user adalah member dari modul ini."""
+    return await modul.user.filter(pk=user.pk).aexists()
+
+
+async def apersist_device_frame(modul: Modul, data: dict):
+    """
+    Menyimpan satu frame dari perangkat dengan ORM async.
+    Hasil sama dengan iot.ingest.persist_device_frame: {"changed_pins": [...], "errors": {...}}
+    """
+    result = {"changed_pins": [], "errors": {}}
+
+    device_log_payload = data.get("device_logs")
+    if device_log_payload:
+        try:
+            await awrite_module_log(modul, device_log_payload)
+        except Exception as e:
+            logger.exception(f"DB> Gagal membuat ModuleLog: {e}")
+            result["errors"]["device_logs"] = str(e)
+
+    if "schedule_data" in data:
+        try:
+            result["changed_pins"] = await aupdate_pin_status(modul, data["schedule_data"])
+        except Exception as e:
+            logger.exception(f"DB> GAGAL memperbarui status pin: {e}")
+            result["errors"]["schedule_data"] = str(e)
+
+    if "readings" in data:
+        try:
+            await awrite_reading_batch(modul, data["readings"])
+        except Exception as e:
+            logger.exception(f"DB> GAGAL menyimpan batch readings: {e}")
+            result["errors"]["readings"] = str(e)
+
+    for key, feature_name in SENSOR_FEATURES.items():
+        if key not in data:
+            continue
+        try:
+            await arecord_sensor_data(modul, feature_name, data[key])
+        except Exception as e:
+            logger.exception(f"DB> GAGAL menambahkan data {feature_name}: {e}")
+            result["errors"][key] = str(e)
+
+    return result
+
+
+async def arecord_sensor_data(modul: Modul, feature_name: str, message):
+    """Masukkan data terakhir & riwayat sensor ke buffer (tanpa thread hop jika registry sudah termuat)."""
+    feature_id = await feature_registry.afeature_id(feature_name)
+    if feature_id is None:
+        logger.warning(f"DB> Feature '{feature_name}' belum terdaftar, data modul {modul.serial_id} diabaikan.")
+        return
+    latest_data.add({(modul.id, feature_id): message})
+    sensor_history.add(SensorReading.from_payload(modul.id, feature_id, message))
+    logger.info(f"DB> Data {feature_name} masuk antrian simpan untuk modul {modul.serial_id}.")
+
+
+async def awrite_reading_batch(modul: Modul, entries):
+    """Versi async dari iot.ingest.write_reading_batch."""
+    feature_ids = {name: await feature_registry.afeature_id(name) for name in SENSOR_FEATURES.values()}
+    readings, latest = collect_batch_readings(modul, entries, feature_ids)
+    if not readings:
+        return 0
+
+    newest_in_history = {
+        feature_id: last
+        async for feature_id, last in SensorReading.objects.filter(modul=modul, feature_id__in=latest.keys())
+        .values('feature_id').annotate(last=Max('recorded_at')).values_list('feature_id', 'last')
+    }
+    await SensorReading.objects.abulk_create(readings, batch_size=settings.SENSOR_BUFFER_MAX_SIZE)
+
+    data_moduls = [
+        DataModul(modul_id=modul.id, feature_id=feature_id, data=data)
+        for feature_id, (recorded_at, data) in latest.items()
+        if newest_in_history.get(feature_id) is None or recorded_at >= newest_in_history[feature_id]
+    ]
+    if data_moduls:
+        await DataModul.objects.abulk_create(
+            data_moduls,
+            update_conflicts=True,
+            unique_fields=['modul', 'feature'],
+            update_fields=['data', 'last_data'],
+        )
+    logger.info(f"DB> {len(readings)} reading batch disimpan untuk modul {modul.serial_id}.")
+    return len(readings)
+
+
+async def aupdate_pin_status(modul: Modul, message):
+    """Versi async dari iot.ingest.update_pin_status."""
+    pin_map = await pin_registry.apin_map(modul.id)
+    states = {pin: status for pin, status in parse_pin_states(message).items() if pin in pin_map}
+    if not states:
+        return []
+    changed = []
+    async for module_pin in ModulePin.objects.filter(module=modul, pin__in=states.keys()):
+        status = states[module_pin.pin]
+        if module_pin.status != status:
+            module_pin.status = status
+            changed.append(module_pin)
+    if changed:
+        await ModulePin.objects.abulk_update(changed, ['status'])
+    logger.info(f"DB> {len(changed)} dari {len(states)} status pin diperbarui di modul {modul.serial_id}.")
+    return changed
+
+
+async def awrite_module_log(modul: Modul, payload: dict):
+    """Versi async dari iot.ingest.write_module_log."""
+    log_id = payload.get("id")
+    log_type = payload.get("type", "modul")
+    name = payload.get("name")
+    log_data = payload.get("data", {})
+
+    # jika ada id maka dia update log yang sudah ada
+    if type(log_id) == type(123):
+        # update log & notifikasi dikerjakan worker celery (iot.tasks.update_module_log)
+        # publish ke broker celery bersifat blocking, jalankan di thread terpisah
+        await sync_to_async(update_module_log.delay, thread_sensitive=False)(
+            log_id=log_id, modul_id=modul.id, log_data=log_data
+        )
+        logger.info(
+            f"DB> Update log {log_id} dikirim ke worker | module={modul.serial_id}"
+        )
+    else:
+        if name == None:
+            name = modul.name
+        await ModuleLog.objects.acreate(module=modul, type=log_type, name=name, data=log_data)
+        logger.info(
+            f"DB> Log dibuat | module={modul.serial_id} | type={log_type}"
+        )
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import time
+from django.conf import settings
+from smartfarming.utils.redis import get_async_redis
+from iot.ingest import SENSOR_FEATURES, parse_timestamp
+from iot.outbound import TELEMETRY, COMMAND
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastGovernor:
+    """
+    Membatasi broadcast telemetry ke grup websocket.
+    - setiap grup paling banyak dikirimi `max_rate` pesan per detik, dijaga bersama semua proses
+      lewat gate redis (beberapa worker mqtt_subscribe bisa menerima pesan perangkat yang sama)
+    - telemetry yang datang di antara dua pengiriman digabung (nilai dengan waktu terbaru per key menang),
+      lalu dikirim sekali ketika jendela waktunya tiba, jadi user selalu menerima state terbaru
+    - pesan kontrol/schedule TIDAK lewat governor, kirim langsung ke channel layer
+    Penyimpanan ke database tidak terpengaruh, governor hanya mengatur broadcast.
+    """
+    GATE_KEY = "iot:telemetry-gate:{}"
+
+    def __init__(self, max_rate=2.0):
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self._last_sent = {}
+        self._pending = {}
+        self._timers = {}
+
+    async def submit(self, group_name, data, send):
+        """
+        Kirim telemetry ke grup atau tunda jika grup baru saja dikirimi.
+        - data: update telemetry {key: (ts, nilai)} (lihat telemetry_updates), digabung dengan yang tertunda
+        - send: coroutine function send(data) yang melakukan broadcast
+        """
+        if not self.min_interval:
+            await send(data)
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        if group_name in self._timers:
+            # sudah ada pengiriman tertunda, gabungkan dengan frame terbaru
+            pending_data, _ = self._pending[group_name]
+            merge_updates(pending_data, data)
+            self._pending[group_name] = (pending_data, send)
+            return
+
+        last_sent = self._last_sent.get(group_name)
+        if last_sent is None or now - last_sent >= self.min_interval:
+            if await self._acquire(group_name):
+                self._last_sent[group_name] = now
+                await send(data)
+                return
+            # proses lain baru saja mengirim ke grup ini
+            delay = self.min_interval
+        else:
+            delay = self.min_interval - (now - last_sent)
+
+        self._pending[group_name] = (dict(data), send)
+        self._schedule(group_name, delay)
+
+    def _schedule(self, group_name, delay):
+        loop = asyncio.get_running_loop()
+        self._timers[group_name] = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush(group_name)))
+
+    async def _flush(self, group_name):
+        if not await self._acquire(group_name):
+            # proses lain baru saja mengirim ke grup ini, tetap tertunda (frame baru tetap digabung)
+            self._schedule(group_name, self.min_interval)
+            return
+        self._timers.pop(group_name, None)
+        pending = self._pending.pop(group_name, None)
+        if pending is None:
+            return
+        data, send = pending
+        self._last_sent[group_name] = asyncio.get_running_loop().time()
+        try:
+            await send(data)
+        except Exception as e:
+            logger.error(f"WS> Gagal mengirim telemetry tertunda ke grup '{group_name}': {e}")
+
+    async def _acquire(self, group_name):
+        """Ambil jendela kirim grup (SET NX PX), True jika proses ini boleh mengirim sekarang."""
+        try:
+            return bool(await get_async_redis().set(
+                self.GATE_KEY.format(group_name), 1, px=max(int(self.min_interval * 1000), 1), nx=True,
+            ))
+        except Exception as e:
+            # redis bermasalah, batas per proses tetap berlaku
+            logger.warning(f"WS> Gagal membaca gate telemetry grup '{group_name}': {e}")
+            return True
+
+
+class TelemetryStateStore:
+    """
+    Menyimpan state telemetry terakhir yang sudah di-broadcast per grup, beserta nomor urut (seq).
+    - diff() menghitung field yang berubah dibanding broadcast sebelumnya, user hanya dikirimi perubahan
+    - waktu setiap key ikut disimpan, nilai yang lebih lama (misal backlog readings) tidak menimpa nilai baru
+    - state hanya ada di redis (hash per grup) dan diff dijalankan atomik di redis (lua), tanpa salinan
+      per proses, jadi beberapa proses yang menerima frame perangkat yang sama tetap konsisten
+    Isi hash: seq, v:<key> (nilai JSON) dan t:<key> (waktu nilai).
+    """
+    KEY = "iot:telemetry-state:{}"
+    TIMEOUT = 60 * 60 * 24 * 7
+    DIFF_SCRIPT = """
+        local changed = {}
+        for i = 2, #ARGV, 3 do
+            local key, ts, value = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+            local old_ts = tonumber(redis.call('HGET', KEYS[1], 't:' .. key) or '0')
+            if tonumber(ts) >= old_ts then
+                redis.call('HSET', KEYS[1], 't:' .. key, ts)
+                if redis.call('HGET', KEYS[1], 'v:' .. key) ~= value then
+                    redis.call('HSET', KEYS[1], 'v:' .. key, value)
+                    table.insert(changed, key)
+                end
+            end
+        end
+        local seq = 0
+        if #changed > 0 then
+            seq = redis.call('HINCRBY', KEYS[1], 'seq', 1)
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+        return {seq, changed}
+    """
+
+    async def diff(self, group_name, updates):
+        """
+        Terapkan update {key: (ts, nilai)} ke state.
+        Mengembalikan (seq, changes) atau None jika tidak ada yang berubah.
+        """
+        if not updates:
+            return None
+        args = [self.TIMEOUT]
+        for key, (ts, value) in updates.items():
+            args += [key, repr(float(ts)), encode_value(value)]
+        try:
+            client = get_async_redis()
+            seq, changed = await client.eval(self.DIFF_SCRIPT, 1, self.KEY.format(group_name), *args)
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal memperbarui state telemetry grup '{group_name}': {e}")
+            return None
+        if not changed:
+            return None
+        return seq, {key: updates[key][1] for key in (k.decode() for k in changed)}
+
+    async def snapshot(self, group_name):
+        """State lengkap terakhir: {"seq": n, "state": {...}}."""
+        try:
+            fields = await get_async_redis().hgetall(self.KEY.format(group_name))
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal membaca state telemetry grup '{group_name}': {e}")
+            fields = {}
+        state = {
+            name.decode()[2:]: json.loads(value)
+            for name, value in fields.items() if name.startswith(b"v:")
+        }
+        return {"seq": int(fields.get(b"seq", 0)), "state": state}
+
+
+def encode_value(value):
+    """JSON kanonik (key terurut) agar nilai yang sama selalu menghasilkan string yang sama di redis."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def telemetry_updates(data, now=None):
+    """
+    Frame perangkat -> update telemetry {key: (ts, nilai)}.
+    - frame live: semua key sensor dengan waktu terima server
+    - frame backlog {"readings": [...]}: hanya entry terbaru per key sensor (ts dari perangkat),
+      array readings sendiri tidak pernah masuk state
+    """
+    now = time.time() if now is None else now
+    updates = {
+        key: (now, value) for key, value in data.items()
+        if key not in ("device", "readings")
+    }
+    entries = data.get("readings")
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        recorded_at = parse_timestamp(entry.get("ts"))
+        if recorded_at is None:
+            continue
+        ts = recorded_at.timestamp()
+        for key in SENSOR_FEATURES:
+            if key in entry and key not in data and (key not in updates or ts >= updates[key][0]):
+                updates[key] = (ts, entry[key])
+    return updates
+
+
+def merge_updates(into, updates):
+    """Gabungkan update telemetry, nilai dengan waktu terbaru per key menang."""
+    for key, (ts, value) in updates.items():
+        if key not in into or ts >= into[key][0]:
+            into[key] = (ts, value)
+    return into
+
+
+def delta_message(seq, changes):
+    """Pesan ke user berisi field telemetry yang berubah saja."""
+    return json.dumps({"type": "telemetry.delta", "seq": seq, "changes": changes}, default=str)
+
+
+def snapshot_message(entry):
+    """Pesan ke user berisi seluruh state telemetry (respon resync)."""
+    return json.dumps({"type": "telemetry.snapshot", "seq": entry["seq"], "state": entry["state"]}, default=str)
+
+
+def is_control_frame(data):
+    """Frame perangkat yang berisi log atau perubahan pin harus langsung dikirim (bypass governor)."""
+    return "device_logs" in data or "schedule_data" in data
+
+
+async def broadcast_device_frame(group_name, data, payload_string, send):
+    """
+    Broadcast frame perangkat ke user grup, sama untuk transport websocket dan MQTT.
+    - frame kontrol (log/pin) dikirim apa adanya
+    - telemetry (termasuk nilai terbaru dari backlog readings) lewat governor lalu dikirim sebagai delta
+    - send: coroutine function send(message, kind) yang melakukan group_send
+    """
+    if is_control_frame(data):
+        await send(payload_string, COMMAND)
+        return
+
+    updates = telemetry_updates(data)
+    if not updates:
+        return
+
+    async def send_delta(merged):
+        delta = await telemetry_state.diff(group_name, merged)
+        if delta is not None:
+            await send(delta_message(*delta), TELEMETRY)
+
+    await telemetry_governor.submit(group_name, updates, send_delta)
+
+
+telemetry_governor = BroadcastGovernor(max_rate=settings.TELEMETRY_BROADCAST_MAX_HZ)
+telemetry_state = TelemetryStateStore()
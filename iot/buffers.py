@@ -0,0 +1,279 @@
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from iot.models import SensorReading, DataModul
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Buffer per-proses untuk menunda penulisan ke database.
+    - add() aman dipanggil dari thread mana pun (consumer, command, worker) dan tidak menyentuh database
+    - data ditulis oleh satu thread flusher setiap `flush_interval` detik atau ketika isi buffer mencapai `max_size`
+    - sisa data ditulis saat proses berhenti (atexit)
+    - jika penulisan batch gagal, batch ditulis ulang per modul agar satu baris bermasalah tidak membuang data
+      modul lain; modul yang tetap gagal dikembalikan ke buffer dan dibuang setelah `max_retries` flush
+    - stats() berisi metrik kedalaman buffer dan latensi flush
+
+    Subclass wajib mengimplementasikan _put(), _drain(), _size(), _write(), _split() dan _restore().
+    """
+    name = "buffer"
+
+    def __init__(self, flush_interval=0.5, max_size=500, max_retries=10):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self._retries = {}  # modul_id -> jumlah flush gagal berturut-turut
+        self._failing = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._metrics = {
+            "flushes": 0,
+            "failed_flushes": 0,
+            "items_written": 0,
+            "items_dropped": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # --- API publik ---
+    def add(self, items):
+        """Masukkan item ke buffer, flush lebih awal jika buffer sudah penuh."""
+        if not items:
+            return
+        with self._lock:
+            self._put(items)
+            size = self._size()
+            if size > self._metrics["max_depth"]:
+                self._metrics["max_depth"] = size
+        self._ensure_thread()
+        if size >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Tulis seluruh isi buffer ke database. Mengembalikan jumlah item yang ditulis."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._drain()
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+                written = len(batch)
+                self._retries.clear()
+                self._failing = False
+            except Exception as e:
+                logger.warning(f"DB> flush {self.name} ({len(batch)} item) gagal, ditulis ulang per modul: {e}")
+                written = self._write_per_modul(batch)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._metrics["flushes"] += 1
+                self._metrics["items_written"] += written
+                self._metrics["last_flush_ms"] = elapsed_ms
+                self._metrics["total_flush_ms"] += elapsed_ms
+                self._metrics["max_flush_ms"] = max(self._metrics["max_flush_ms"], elapsed_ms)
+            logger.debug(f"DB> flush {self.name}: {len(batch)} item dalam {elapsed_ms:.1f} ms")
+            if elapsed_ms > self.flush_interval * 1000:
+                logger.warning(f"DB> flush {self.name} lebih lama dari interval flush ({elapsed_ms:.1f} ms)")
+            return written
+
+    def _write_per_modul(self, batch):
+        """
+        Tulis batch per modul setelah penulisan sekaligus gagal. Modul yang gagal dikembalikan ke buffer
+        untuk flush berikutnya, kecuali sudah gagal `max_retries` kali. Mengembalikan jumlah item yang ditulis.
+        """
+        written, failed, dropped = 0, [], 0
+        for modul_id, group in self._split(batch).items():
+            try:
+                self._write(group)
+            except Exception as e:
+                retries = self._retries.get(modul_id, 0) + 1
+                if retries >= self.max_retries:
+                    self._retries.pop(modul_id, None)
+                    dropped += len(group)
+                    logger.error(f"DB> GAGAL flush {self.name} modul {modul_id} {retries} kali, {len(group)} item dibuang: {e}")
+                else:
+                    self._retries[modul_id] = retries
+                    failed.append(group)
+                continue
+            self._retries.pop(modul_id, None)
+            written += len(group)
+
+        with self._lock:
+            self._metrics["failed_flushes"] += 1
+            self._metrics["items_dropped"] += dropped
+            # dikembalikan dari yang terbaru agar urutan data tetap terjaga
+            for group in reversed(failed):
+                self._restore(group)
+        self._failing = bool(failed)
+        return written
+
+    def stats(self):
+        """Metrik buffer: kedalaman saat ini, jumlah flush dan latensi flush (ms)."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["depth"] = self._size()
+        total_flush_ms = metrics.pop("total_flush_ms")
+        metrics["avg_flush_ms"] = total_flush_ms / metrics["flushes"] if metrics["flushes"] else 0.0
+        metrics["name"] = self.name
+        return metrics
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    # --- hook untuk subclass ---
+    def _put(self, items):
+        raise NotImplementedError
+
+    def _drain(self):
+        raise NotImplementedError
+
+    def _size(self):
+        raise NotImplementedError
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _split(self, batch):
+        """Pecah batch per modul -> {modul_id: batch}."""
+        raise NotImplementedError
+
+    def _restore(self, batch):
+        """Kembalikan batch yang gagal ditulis ke buffer tanpa menimpa data yang lebih baru."""
+        raise NotImplementedError
+
+    # --- thread flusher ---
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # thread ini punya koneksi database sendiri, buang jika sudah kadaluarsa
+            close_old_connections()
+            self.flush()
+            if self._failing:
+                # beri jeda satu interval sebelum mencoba lagi, walau buffer penuh memicu wakeup
+                time.sleep(self.flush_interval)
+
+
+class SensorHistoryBuffer(WriteBehindBuffer):
+    """Menampung SensorReading lalu menulisnya dengan satu bulk_create per flush."""
+    name = "sensor-history"
+
+    def __init__(self, flush_interval=0.5, max_size=500, max_retries=10):
+        super().__init__(flush_interval=flush_interval, max_size=max_size, max_retries=max_retries)
+        self._items = []
+
+    def _put(self, items):
+        self._items.extend(items)
+
+    def _drain(self):
+        batch, self._items = self._items, []
+        return batch
+
+    def _size(self):
+        return len(self._items)
+
+    def _write(self, batch):
+        SensorReading.objects.bulk_create(batch, batch_size=self.max_size)
+
+    def _split(self, batch):
+        groups = {}
+        for reading in batch:
+            groups.setdefault(reading.modul_id, []).append(reading)
+        return groups
+
+    def _restore(self, batch):
+        # pembacaan lama ditaruh di depan pembacaan yang masuk selama flush
+        self._items[:0] = batch
+
+
+class LatestDataBuffer(WriteBehindBuffer):
+    """
+    Menampung data terakhir per (modul_id, feature_id).
+    Data yang masuk untuk key yang sama akan saling menimpa (coalesce),
+    lalu ditulis dengan satu bulk upsert (INSERT ... ON CONFLICT DO UPDATE).
+    """
+    name = "latest-data"
+
+    def __init__(self, flush_interval=0.5, max_size=500, max_retries=10):
+        super().__init__(flush_interval=flush_interval, max_size=max_size, max_retries=max_retries)
+        self._items = {}
+
+    def _put(self, items):
+        # items: {(modul_id, feature_id): data}
+        self._items.update(items)
+
+    def _drain(self):
+        batch, self._items = self._items, {}
+        return batch
+
+    def _size(self):
+        return len(self._items)
+
+    def _write(self, batch):
+        objs = [
+            DataModul(modul_id=modul_id, feature_id=feature_id, data=data)
+            for (modul_id, feature_id), data in batch.items()
+        ]
+        DataModul.objects.bulk_create(
+            objs,
+            batch_size=self.max_size,
+            update_conflicts=True,
+            unique_fields=['modul', 'feature'],
+            update_fields=['data', 'last_data'],
+        )
+
+    def _split(self, batch):
+        groups = {}
+        for (modul_id, feature_id), data in batch.items():
+            groups.setdefault(modul_id, {})[(modul_id, feature_id)] = data
+        return groups
+
+    def _restore(self, batch):
+        # data yang masuk selama flush lebih baru, jangan ditimpa
+        for key, data in batch.items():
+            self._items.setdefault(key, data)
+
+
+sensor_history = SensorHistoryBuffer(
+    flush_interval=settings.SENSOR_BUFFER_FLUSH_INTERVAL_MS / 1000,
+    max_size=settings.SENSOR_BUFFER_MAX_SIZE,
+    max_retries=settings.SENSOR_BUFFER_MAX_RETRIES,
+)
+latest_data = LatestDataBuffer(
+    flush_interval=settings.SENSOR_BUFFER_FLUSH_INTERVAL_MS / 1000,
+    max_size=settings.SENSOR_BUFFER_MAX_SIZE,
+    max_retries=settings.SENSOR_BUFFER_MAX_RETRIES,
+)
+
+
+def flush_sensor_buffers():
+    """Paksa flush semua buffer sensor (dipanggil saat consumer ditutup dan saat proses berhenti)."""
+    return latest_data.flush() + sensor_history.flush()
+
+
+def sensor_buffer_stats():
+    """Metrik seluruh buffer sensor di proses ini."""
+    return [latest_data.stats(), sensor_history.stats()]
+
+
+atexit.register(flush_sensor_buffers)
@@ -0,0 +1,81 @@
+"""
+Codec frame perangkat IoT.
+Perangkat boleh mengirim frame JSON (text) atau biner (MessagePack / CBOR) agar hemat CPU & bandwidth.
+Encoding dipilih sekali per koneksi saat handshake, lewat subprotocol websocket
+(scit.json, scit.msgpack, scit.cbor) atau query string ?encoding=msgpack.
+Setelah di-decode semua handler menerima struktur dict yang sama.
+"""
+import json
+from urllib.parse import parse_qs
+import cbor2
+import msgpack
+
+JSON = "json"
+MSGPACK = "msgpack"
+CBOR = "cbor"
+
+SUBPROTOCOLS = {
+    "scit.json": JSON,
+    "scit.msgpack": MSGPACK,
+    "scit.cbor": CBOR,
+}
+
+
+class FrameDecodeError(ValueError):
+    """Frame tidak bisa di-decode dengan encoding yang dipilih."""
+
+
+def available_encodings():
+    return [JSON, MSGPACK, CBOR]
+
+
+def negotiate_encoding(scope):
+    """
+    Menentukan encoding koneksi dari scope websocket.
+    Mengembalikan (encoding, subprotocol) dimana subprotocol adalah nilai yang harus
+    dikirim balik saat accept (None jika client tidak meminta subprotocol encoding).
+    """
+    encodings = available_encodings()
+    for subprotocol in scope.get('subprotocols') or []:
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding in encodings:
+            return encoding, subprotocol
+
+    query_params = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+    encoding = query_params.get('encoding', [JSON])[0].lower()
+    if encoding not in encodings:
+        encoding = JSON
+    return encoding, None
+
+
+def decode_frame(text_data=None, bytes_data=None, encoding=JSON):
+    """
+    Decode frame websocket menjadi objek python.
+    - text_data selalu dianggap JSON
+    - bytes_data di-decode sesuai encoding koneksi
+    """
+    try:
+        if text_data is not None:
+            return json.loads(text_data)
+        if encoding == MSGPACK:
+            # strict_map_key=False agar key angka (misal nomor pin) tetap diterima
+            return msgpack.unpackb(bytes_data, raw=False, strict_map_key=False)
+        if encoding == CBOR:
+            return cbor2.loads(bytes_data)
+        return json.loads(bytes_data)
+    except (ValueError, TypeError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+        raise FrameDecodeError(str(e) or type(e).__name__) from e
+    except Exception as e:
+        # error decode cbor2 tidak punya base class yang sama di semua versi
+        if cbor2 is not None and isinstance(e, cbor2.CBORDecodeError):
+            raise FrameDecodeError(str(e) or type(e).__name__) from e
+        raise
+
+
+def encode_frame(data, encoding=JSON):
+    """Encode objek python sesuai encoding (dipakai perangkat simulasi & benchmark)."""
+    if encoding == MSGPACK:
+        return msgpack.packb(data, use_bin_type=True)
+    if encoding == CBOR:
+        return cbor2.dumps(data)
+    return json.dumps(data)
@@ -1,11 +1,16 @@
+import hmac
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from rest_framework_simplejwt.models import TokenUser
+from django.conf import settings
 from iot.models import *
-from schedule.models import GroupSchedule
-from smartfarming.tasks import task_broadcast_module_notification
-from profil.models import NotificationType, Notification
-import asyncio
+from iot.buffers import flush_sensor_buffers
+from iot import ingest, async_ingest, presence
+from iot.codec import decode_frame, negotiate_encoding, FrameDecodeError
+from iot.broadcast import telemetry_state, broadcast_device_frame, snapshot_message
+from iot.outbound import OutboundQueue, COMMAND
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,7 +22,12 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
     - <serial_id> dan <auth_id> didapatkan dari database modul
     - perangkat iot harus mengirimkan pesan setidaknya sekali untuk mendapatkan pesan dari user
     - jika pesan dikirim dari user maka harus menambahkan Autorization dengan value Bearer {{access_token}}
-    - jika pesan dikirim dari perangkat IoT maka harus dalam format json dan wajib ada {"device": "{{auth_id}}"}
+    - perangkat IoT sebaiknya otentikasi sekali saat handshake lewat header X-Auth-ID: {{auth_id}}
+      atau subprotocol auth.{{auth_id}}, setelah itu frame tidak perlu membawa key "device"
+    - cara lama tetap didukung: frame json pertama wajib ada {"device": "{{auth_id}}"}
+    - perangkat boleh mengirim frame biner msgpack/cbor dengan subprotocol scit.msgpack/scit.cbor atau ?encoding=msgpack
+    - telemetry ke user dikirim sebagai delta {"type": "telemetry.delta", "seq": n, "changes": {...}},
+      user mengirim {"type": "resync"} untuk meminta snapshot lengkap (juga dikirim otomatis saat connect)
     - jika mengirim pesan tanpa header Autorization atau json {"device": "{{auth_id}}"} maka akan dianggap sebagai anonim
     - jika ada anonim connect ke wss maka pesan tidak akan dikirimkan ke grup websocket manapun
     """
@@ -30,7 +40,15 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
         self.serial_id = self.scope['url_route']['kwargs']['serial_id']
         self.group_name = f'grup_{self.serial_id}'
         self.user = self.scope['user']
+        # user dari claim token (koneksi ?mode=readonly) hanya boleh menerima pesan, tidak mengirim
+        self.read_only = isinstance(self.user, TokenUser)
         self.connection_accepted = False
+        self.is_device = False
+        self.is_member = False
+        self.outbound = None
+        self.presence_touched_at = 0
+        # encoding frame biner koneksi ini (json/msgpack/cbor), lihat iot/codec.py
+        self.encoding, self.subprotocol = negotiate_encoding(self.scope)
 
         # apakah modul dengan serial_id ini ada di database
         self.modul = await self.get_modul()
@@ -40,8 +58,9 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
             return
 
         if self.user.is_authenticated:
-            is_member = await self.is_user_member_of_modul()
-            if not is_member:
+            # hasil cek keanggotaan disimpan di koneksi ini, dicabut lewat event membership.revoked
+            self.is_member = await self.is_user_member_of_modul()
+            if not self.is_member:
                 logger.warning(f"WS> REJECTED: User {self.user.username} tidak punya akses ke modul {self.serial_id}.")
                 await self.close()
                 return
@@ -50,27 +69,50 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
             await self.add_to_group()
             logger.info(f"WS> User {self.user.username} ({self.channel_name}) terhubung ke grup '{self.group_name}'")
         else:
-            # Jika koneksi tanpa user (kemungkinan dari perangkat IoT),
-            # kita terima koneksi tapi belum dimasukkan ke grup.
-            # Perangkat harus mengirim pesan otentikasi terlebih dahulu.
-            logger.info(f"WS> Perangkat ({self.channel_name}) terhubung, menunggu otentikasi untuk grup '{self.group_name}'")
-
-        # Terima koneksi
-        await self.accept()
+            auth_id, auth_subprotocol = self.get_handshake_auth_id()
+            if auth_id is not None:
+                # perangkat otentikasi saat handshake, langsung masuk grup sekali ini saja
+                if not await self.authenticate_device(auth_id):
+                    await self.close()
+                    return
+                # subprotocol auth harus dibalas jika client tidak meminta subprotocol encoding
+                self.subprotocol = self.subprotocol or auth_subprotocol
+                logger.info(f"WS> Perangkat ({self.channel_name}) terotentikasi saat handshake ke grup '{self.group_name}'")
+            else:
+                # Jika koneksi tanpa user (kemungkinan dari perangkat IoT),
+                # kita terima koneksi tapi belum dimasukkan ke grup.
+                # Perangkat harus mengirim pesan otentikasi terlebih dahulu.
+                logger.info(f"WS> Perangkat ({self.channel_name}) terhubung, menunggu otentikasi untuk grup '{self.group_name}'")
+
+        # Terima koneksi, pesan dari grup dikirim lewat antrian berbatas (lihat iot/outbound.py)
+        self.outbound = OutboundQueue(self.send)
+        self.outbound.start()
+        await self.accept(subprotocol=self.subprotocol)
         await self.send(text_data=json.dumps({"status": "Connected to Websocket"}))
+        if self.is_member:
+            # user mulai dari state lengkap, selanjutnya hanya menerima delta
+            await self.send_snapshot()
 
     async def disconnect(self, close_code):
-        """Dipanggil saat koneksi ditutup."""
-        await self.send(text_data=json.dumps({"status": "Disconnected from Websocket"}))
+        """Dipanggil saat koneksi ditutup (socket sudah tertutup, tidak ada lagi yang bisa dikirim ke client)."""
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.outbound is not None:
+            await self.outbound.close()
+            if self.outbound.dropped:
+                logger.warning(f"WS> Client {self.channel_name} lambat, {self.outbound.dropped} pesan telemetry dibuang.")
+        if self.is_device:
+            # pastikan data sensor yang masih di buffer tersimpan saat perangkat terputus
+            await database_sync_to_async(flush_sensor_buffers)()
+            await presence.amark_offline(self.modul.id)
         logger.warning(f"WS> Client {self.channel_name} terputus dari grup '{self.group_name}'")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Optimized receive method:
-        1. Parallel processing untuk penyimpanan DB sensor.
+        1. Satu thread hop & satu transaksi untuk menyimpan seluruh frame perangkat.
         2. Structured error handling untuk tracing.
         3. Efficient broadcasting.
+        4. Frame biner (msgpack/cbor) sesuai encoding yang dipilih saat handshake.
         """
         try:
             # TRACING INPUT & PARSING
@@ -79,10 +121,14 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
                 data = text_data
                 # Jika input sudah dict, kita butuh string-nya untuk broadcast hemat resource
                 payload_string = json.dumps(data) 
-            else:
-                # Jika text_data adalah string/bytes
-                data = json.loads(text_data)
+            elif text_data is not None:
+                # Jika text_data adalah string
+                data = decode_frame(text_data=text_data)
                 payload_string = text_data
+            else:
+                # Frame biner, user tetap menerima JSON
+                data = decode_frame(bytes_data=bytes_data, encoding=self.encoding)
+                payload_string = json.dumps(data, default=str)
 
             # VALIDASI tipe data
             if not isinstance(data, dict):
@@ -92,60 +138,36 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
 
             # LOGIC PEMROSESAN
             
-            # KASUS A: Pesan dari PERANGKAT (Ada key 'device')
-            device_auth = data.get("device", None)
-
-            if device_auth is not None:
-                device_auth_id = data.get('device')
-
-                # Validasi Auth
-                if str(self.modul.auth_id) != device_auth_id:
-                    logger.warning(f"WS-SECURITY> Device Auth Gagal. ID: {self.serial_id}, Input: {device_auth_id}")
+            # KASUS A: Pesan dari PERANGKAT (sudah terotentikasi, atau frame pertama dengan key 'device')
+            if self.is_device or data.get("device") is not None:
+                # Validasi Auth hanya sekali per koneksi (cara lama), setelah itu koneksi sudah di grup
+                if not self.is_device and not await self.authenticate_device(data.get("device")):
                     return
-                device_log_payload = data.get("device_logs")
-                if device_log_payload:
-                    await self.create_module_log(device_log_payload)
-
-                # Mapping: Kunci JSON -> Fungsi Handler
-                # Tips: Jika nambah sensor baru, cukup tambah di sini.
-                sensor_handlers = {
-                    'schedule_data': self.update_pin_status,
-                    'temperature_data': self.update_temperature_data,
-                    'humidity_data': self.update_humidity_data,
-                    'battery_data': self.update_battery_data,
-                    'water_level_data': self.update_water_level_data,
-                }
-
-                # Kumpulkan tugas (tasks) yang valid
-                tasks = []
-                for key, handler in sensor_handlers.items():
-                    if key in data:
-                        # panggil fungsi tapi jangan di-await dulu
-                        tasks.append(handler(data[key]))
-
-                # EFISIENSI: Jalankan semua update database secara PARALEL
-                if tasks:
-                    # return_exceptions=True agar jika 1 sensor error, yang lain tetap tersimpan
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Tracing error parsial (misal suhu sukses, tapi baterai gagal)
-                    for i, res in enumerate(results):
-                        if isinstance(res, Exception):
-                            logger.error(f"WS-TASK> Error pada task sensor: {res}")
-
-                # Logic Grup & Broadcast
-                await self.add_to_group()
-                await self.broadcast_message_to_group(payload_string) # Kirim string asli (hemat CPU)
+                await self.touch_presence()
+                # Simpan seluruh isi frame (log, pin, sensor) dalam satu thread hop & satu transaksi
+                result = await self.persist_frame(data)
+                for key, error in result["errors"].items():
+                    logger.error(f"WS-TASK> Error pada {key}: {error}")
+
+                # Broadcast: frame kontrol dikirim string asli (hemat CPU), telemetry dibatasi
+                # per grup (TELEMETRY_BROADCAST_MAX_HZ) dan hanya field yang berubah yang dikirim (delta + seq)
+                await broadcast_device_frame(self.group_name, data, payload_string, self.broadcast_message_to_group)
                 
                 logger.info(f"WS-OK> Device {self.serial_id}: Data processed & broadcasted.")
 
             # KASUS B: Pesan dari USER (Tidak ada key 'device')
+            elif data.get("type") == "resync":
+                if self.is_member:
+                    await self.send_snapshot()
             else:
                 await self._handle_user_message(payload_string)
 
-        except json.JSONDecodeError as e:
+        except FrameDecodeError as e:
+            if text_data is None:
+                logger.error(f"WS-PARSE> Frame biner ({self.encoding}) tidak valid: {e}")
+                return
             # Error Parsing JSON spesifik
-            logger.error(f"WS-PARSE> JSON Error di baris {e.lineno}: {e.msg}. Data: {text_data}...")
+            logger.error(f"WS-PARSE> JSON Error: {e}. Data: {text_data}...")
             # Fallback: Mungkin user kirim raw text, coba handle sebagai pesan user
             await self._handle_user_message(text_data)
 
@@ -155,196 +177,117 @@ class DeviceAuthConsumer(AsyncWebsocketConsumer):
 
     async def _handle_user_message(self, message):
         """Helper untuk memproses pesan user agar kode utama rapi"""
-        if self.user.is_authenticated and await self.is_user_member_of_modul():
+        if self.user.is_authenticated and self.is_member and not self.read_only:
             await self.broadcast_message_to_group(message)
             logger.info(f"WS-USER> User {self.user.username} broadcast pesan.")
         else:
             logger.warning(f"WS-SECURITY> Akses user ditolak di grup {self.group_name}.")
 
-    async def broadcast_message_to_group(self, message):
-        """Helper untuk mengirim pesan ke channel layer."""
+    async def broadcast_message_to_group(self, message, kind=COMMAND):
+        """
+        Helper untuk mengirim pesan ke channel layer.
+        kind=TELEMETRY boleh dibuang oleh antrian client yang lambat, selain itu selalu terkirim.
+        """
         await self.channel_layer.group_send(
             self.group_name,
             {
                 'type': 'channel.message',
                 'message': message,
-                'sender_channel_name': self.channel_name
+                'sender_channel_name': self.channel_name,
+                'kind': kind,
             }
         )
 
+    async def send_snapshot(self):
+        """Kirim state telemetry lengkap ke client ini saja (respon resync)."""
+        entry = await telemetry_state.snapshot(self.group_name)
+        self.outbound.put(snapshot_message(entry))
+
     async def channel_message(self, event):
-        """Menerima pesan dari grup dan mengirimkannya ke client."""
-        message = event['message']
+        """
+        Menerima pesan dari grup dan mengirimkannya ke client.
+        Event bisa membawa beberapa pesan sekaligus di 'messages' (dispatch alarm batch),
+        setiap pesan tetap dikirim sebagai frame websocket terpisah.
+        """
+        messages = event['messages'] if 'messages' in event else [event['message']]
         sender_channel_name = event['sender_channel_name']
 
         # Jika pengirimnya adalah celery_worker, kirim ke semua.
         # Jika pengirimnya adalah client lain, jangan kirim kembali ke pengirim.
         if sender_channel_name == 'celery_worker' or self.channel_name != sender_channel_name:
-            await self.send(text_data=message)
-
-    async def add_to_group(self):
-        """Helper untuk menambahkan channel ke grup."""
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-
-    # --- Fungsi Bantuan untuk Akses Database ---
-    @database_sync_to_async
-    def get_modul(self):
-        """Mengambil instance Modul dari database secara async."""
-        try:
-            return Modul.objects.get(serial_id=self.serial_id)
-        except Modul.DoesNotExist:
-            return None
-
-    @database_sync_to_async
-    def is_user_member_of_modul(self):
-        """Mengecek apakah user adalah member dari modul ini."""
-        # Query many-to-many: cek apakah user ada di dalam `self.modul.user.all()`
-        return self.modul.user.filter(pk=self.user.pk).exists()
-    
-    @database_sync_to_async
-    def create_module_log(self, payload: dict):
-        try:
-            # Ekstraksi Value dari payload
-            log_id = payload.get("id")
-            log_type = payload.get("type", "modul")
-            name = payload.get("name")
-            log_data = payload.get("data", {})
-
-            # jika ada id maka dia update log yang sudah ada
-            if type(log_id) == type(123):
-                pins = log_data.get("pins", [])
-                modul_pin = ModulePin.objects.filter(module=self.modul)
-                message = log_data.get("message", "IoT sedang menjalankan tugas")
-                
-                # Mapping: {6: "relay 1", 7: "relay 2"}
-                pin_map = {mp.pin: mp.name for mp in modul_pin}
-                
-                # Update nilai pin di dalam list pins
-                # Karena 'pins' adalah referensi ke dalam 'log_data', 
-                # mengubah 'p' berarti mengubah isi 'log_data' juga.
-                for p in pins:
-                    original_pin = p.get("pin")
-                    # Ganti angka dengan nama jika ada di map, jika tidak biarkan angkanya
-                    if original_pin in pin_map:
-                        p["pin"] = pin_map[original_pin]
-
-                update_log = ModuleLog.objects.get(id=log_id)
-                schedule_name = GroupSchedule.objects.get(id= update_log.schedule.id)
-                
-                # Simpan 'log_data' yang strukturnya sudah benar & terupdate
-                update_log.data = log_data 
-                update_log.save()
-                users = self.modul.user.all()
-                title = f"Informasi Penjadwalan {schedule_name.name}"
-                user_ids = list(self.modul.user.values_list('id', flat=True))
-                Notification.bulk_create_for_users(users=users, notif_type=NotificationType.SCHEDULE, title=title, body=message, data=log_data)
-                task_broadcast_module_notification.delay(user_ids=user_ids,modul_id=self.modul.id, title=title, body=message, data=log_data)
-                logger.info(
-                    f"DB> Log diperbarui | module={self.modul.serial_id} | type={update_log.type}"
-                )
-            else:                
-                if name == None:
-                    name = self.modul.name
-                ModuleLog.objects.create(
-                    module=self.modul,
-                    type=log_type,
-                    name=name,
-                    data=log_data # Simpan data dict mentah
-                )
-
-                logger.info(
-                    f"DB> Log dibuat | module={self.modul.serial_id} | type={log_type}"
-                )
+            # event tanpa kind (misal dari celery) dianggap command, tidak pernah dibuang
+            kind = event.get('kind', COMMAND)
+            for message in messages:
+                self.outbound.put(message, kind)
 
-        except Exception as e:
-            logger.exception(f"Gagal membuat ModuleLog: {e}")
-
-    @database_sync_to_async
-    def update_pin_status(self, message):
+    async def membership_revoked(self, event):
         """
-        Fungsi untuk membuat objek ScheduleLog di database secara asynchronous.
+        Dipanggil lewat channel layer ketika user dikeluarkan dari modul (lihat iot/signals.py).
+        Koneksi milik user tersebut langsung kehilangan akses dan ditutup.
         """
-        try:
-            pins = next((item.get('pins') for item in message if isinstance(item, dict) and 'pins' in item), None )
-            if not pins :
-                return
-            for pin in pins:
-                for key, value in pin.items():
-                    obj = ModulePin.objects.get(module=self.modul, pin=key)
-                    obj.status = value == "1"
-                    obj.save(update_fields=["status"])
-            logger.info(f"DB> status pin berhasil diperbarui di modul {self.modul.serial_id}.")
-
-        except ModulePin.DoesNotExist:
-            logger.exception("Module Pin tidak ditemukan")
-        except Exception as e:
-            logger.exception(f"DB> GAGAL membuat log: {e}")
-
+        # pk TokenUser (koneksi ?mode=readonly) berupa string dari claim token, user_ids berupa int
+        if not self.user.is_authenticated or str(self.user.pk) not in {str(user_id) for user_id in event['user_ids']}:
+            return
+        self.is_member = False
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        logger.warning(f"WS-SECURITY> Akses user {self.user.username} ke grup '{self.group_name}' dicabut.")
+        await self.close()
 
-    @database_sync_to_async
-    def update_temperature_data(self, message):
+    def get_handshake_auth_id(self):
         """
-        Fungsi untuk membuat objek ScheduleLog di database secara asynchronous.
+        auth_id perangkat dari handshake: header X-Auth-ID atau subprotocol auth.<auth_id>.
+        Mengembalikan (auth_id, subprotocol auth) atau (None, None).
         """
-        try:
-            feature = Feature.objects.get(name='temperature')
-            data_modul, created = DataModul.objects.update_or_create(modul=self.modul, feature=feature, defaults={'data': message})
-
-            # Periksa boolean 'created'
-            if created:
-                logger.info(f"DB> Data temperatur BERHASIL DIBUAT untuk modul {self.modul.serial_id}.")
-            else:
-                logger.info(f"DB> Data temperatur BERHASIL DIUPDATE untuk modul {self.modul.serial_id}.")
-        except Exception as e:
-            logger.exception(f"DB> GAGAL menambahkan data: {e}")
-
-    @database_sync_to_async
-    def update_humidity_data(self, message):
+        for subprotocol in self.scope.get('subprotocols') or []:
+            if subprotocol.startswith('auth.'):
+                return subprotocol[len('auth.'):], subprotocol
+        for name, value in self.scope.get('headers', []):
+            if name == b'x-auth-id':
+                return value.decode('utf-8', 'replace'), None
+        return None, None
+
+    async def authenticate_device(self, auth_id):
         """
-        Fungsi untuk membuat objek ScheduleLog di database secara asynchronous.
+        Validasi auth_id perangkat. Jika cocok koneksi ditandai sebagai perangkat,
+        dicatat online dan masuk grup (sekali per koneksi).
         """
-        try:
-            feature = Feature.objects.get(name='humidity')
-            data_modul, created = DataModul.objects.update_or_create(modul=self.modul, feature=feature, defaults={'data': message})
-
-            # Periksa boolean 'created'
-            if created:
-                logger.info(f"DB> Data humidity BERHASIL DIBUAT untuk modul {self.modul.serial_id}.")
-            else:
-                logger.info(f"DB> Data humidity BERHASIL DIUPDATE untuk modul {self.modul.serial_id}.")
-        except Exception as e:
-            logger.exception(f"DB> GAGAL menambahkan data: {e}")
+        if not hmac.compare_digest(str(self.modul.auth_id).encode(), str(auth_id).encode()):
+            logger.warning(f"WS-SECURITY> Device Auth Gagal. ID: {self.serial_id}, Input: {auth_id}")
+            return False
+        self.is_device = True
+        self.presence_touched_at = time.monotonic()
+        await presence.amark_online(self.modul.id)
+        await self.add_to_group()
+        return True
+
+    async def touch_presence(self):
+        """Perbarui last seen perangkat di redis, paling sering sekali per DEVICE_PRESENCE_TOUCH_INTERVAL."""
+        now = time.monotonic()
+        if now - self.presence_touched_at >= settings.DEVICE_PRESENCE_TOUCH_INTERVAL:
+            self.presence_touched_at = now
+            await presence.atouch(self.modul.id)
 
-    @database_sync_to_async
-    def update_battery_data(self, message):
-        """
-        Fungsi untuk membuat objek ScheduleLog di database secara asynchronous.
-        """
-        try:
-            feature = Feature.objects.get(name='battery')
-            data_modul, created = DataModul.objects.update_or_create(modul=self.modul, feature=feature, defaults={'data': message})
+    async def add_to_group(self):
+        """Helper untuk menambahkan channel ke grup."""
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
 
-            # Periksa boolean 'created'
-            if created:
-                logger.info(f"DB> Data battery BERHASIL DIBUAT untuk modul {self.modul.serial_id}.")
-            else:
-                logger.info(f"DB> Data battery BERHASIL DIUPDATE untuk modul {self.modul.serial_id}.")
-        except Exception as e:
-            logger.exception(f"DB> GAGAL menambahkan data: {e}")
-    
-    @database_sync_to_async
-    def update_water_level_data(self, message):
-        """
-        Fungsi untuk membuat objek ScheduleLog di database secara asynchronous.
-        """
-        try:
-            feature = Feature.objects.get(name='water_level')
-            data_modul, created = DataModul.objects.update_or_create(modul=self.modul, feature=feature, defaults={'data': message})
+    # --- Fungsi Bantuan untuk Akses Database ---
+    # IOT_INGEST_ASYNC=True memakai ORM async (iot.async_ingest),
+    # selain itu satu thread hop per operasi (iot.ingest)
+    async def get_modul(self):
+        """Mengambil instance Modul dari database secara async."""
+        if settings.IOT_INGEST_ASYNC:
+            return await async_ingest.aget_modul(self.serial_id)
+        return await database_sync_to_async(ingest.get_modul)(self.serial_id)
 
-            # Periksa boolean 'created'
-            if created:
-                logger.info(f"DB> Data water level BERHASIL DIBUAT untuk modul {self.modul.serial_id}.")
-            else:
-                logger.info(f"DB> Data water level BERHASIL DIUPDATE untuk modul {self.modul.serial_id}.")
-        except Exception as e:
-            logger.exception(f"DB> GAGAL menambahkan data: {e}")
\ No newline at end of file
+    async def is_user_member_of_modul(self):
+        """Mengecek apakah user adalah member dari modul ini."""
+        if settings.IOT_INGEST_ASYNC:
+            return await async_ingest.ais_user_member_of_modul(self.modul, self.user)
+        return await database_sync_to_async(ingest.is_user_member_of_modul)(self.modul, self.user)
+
+    async def persist_frame(self, data):
+        """Menyimpan frame perangkat (satu transaksi & savepoint per key pada jalur sync)."""
+        if settings.IOT_INGEST_ASYNC:
+            return await async_ingest.apersist_device_frame(self.modul, data)
+        return await database_sync_to_async(ingest.persist_device_frame)(self.modul, data)
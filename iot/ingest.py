@@ -0,0 +1,242 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from iot.models import Modul, ModulePin, ModuleLog, SensorReading, DataModul
+from iot.buffers import sensor_history, latest_data
+from iot.registry import feature_registry, pin_registry
+from iot.tasks import update_module_log
+
+logger = logging.getLogger(__name__)
+
+# Mapping: Kunci JSON -> nama Feature
+# Tips: Jika nambah sensor baru, cukup tambah di sini.
+SENSOR_FEATURES = {
+    'temperature_data': 'temperature',
+    'humidity_data': 'humidity',
+    'battery_data': 'battery',
+    'water_level_data': 'water_level',
+}
+
+
+def get_modul(serial_id):
+    """Mengambil instance Modul berdasarkan serial_id, None jika tidak ada."""
+    try:
+        return Modul.objects.get(serial_id=serial_id)
+    except Modul.DoesNotExist:
+        return None
+
+
+def is_user_member_of_modul(modul: Modul, user):
+    """Mengecek apakah user adalah member dari modul ini."""
+    # Query many-to-many: cek apakah user ada di dalam `modul.user.all()`
+    return modul.user.filter(pk=user.pk).exists()
+
+
+def persist_device_frame(modul: Modul, data: dict):
+    """
+    Menyimpan satu frame dari perangkat dalam satu transaksi (dipanggil dalam satu thread hop).
+    - device_logs dan schedule_data masing-masing dijalankan di savepoint sendiri,
+      jadi jika satu gagal yang lain tetap tersimpan
+    - data sensor dimasukkan ke write-behind buffer (tidak menyentuh database di sini)
+    - readings (batch data bertimestamp) ditulis langsung dengan bulk insert di savepoint sendiri
+
+    Mengembalikan dict:
+    - changed_pins: list ModulePin yang statusnya berubah
+    - errors: {key: pesan error} untuk key yang gagal diproses
+    """
+    result = {"changed_pins": [], "errors": {}}
+
+    with transaction.atomic():
+        device_log_payload = data.get("device_logs")
+        if device_log_payload:
+            try:
+                with transaction.atomic():
+                    write_module_log(modul, device_log_payload)
+            except Exception as e:
+                logger.exception(f"DB> Gagal membuat ModuleLog: {e}")
+                result["errors"]["device_logs"] = str(e)
+
+        if "schedule_data" in data:
+            try:
+                with transaction.atomic():
+                    result["changed_pins"] = update_pin_status(modul, data["schedule_data"])
+            except Exception as e:
+                logger.exception(f"DB> GAGAL memperbarui status pin: {e}")
+                result["errors"]["schedule_data"] = str(e)
+
+        if "readings" in data:
+            try:
+                with transaction.atomic():
+                    write_reading_batch(modul, data["readings"])
+            except Exception as e:
+                logger.exception(f"DB> GAGAL menyimpan batch readings: {e}")
+                result["errors"]["readings"] = str(e)
+
+    for key, feature_name in SENSOR_FEATURES.items():
+        if key not in data:
+            continue
+        try:
+            record_sensor_data(modul, feature_name, data[key])
+        except Exception as e:
+            logger.exception(f"DB> GAGAL menambahkan data {feature_name}: {e}")
+            result["errors"][key] = str(e)
+
+    return result
+
+
+def record_sensor_data(modul: Modul, feature_name: str, message):
+    """Masukkan data terakhir & riwayat sensor ke buffer, keduanya ditulis secara batch."""
+    feature_id = feature_registry.feature_id(feature_name)
+    if feature_id is None:
+        logger.warning(f"DB> Feature '{feature_name}' belum terdaftar, data modul {modul.serial_id} diabaikan.")
+        return
+    latest_data.add({(modul.id, feature_id): message})
+    sensor_history.add(SensorReading.from_payload(modul.id, feature_id, message))
+    logger.info(f"DB> Data {feature_name} masuk antrian simpan untuk modul {modul.serial_id}.")
+
+
+def parse_timestamp(value):
+    """Timestamp reading: unix epoch (detik) atau string ISO 8601. None jika tidak valid."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+
+def collect_batch_readings(modul: Modul, entries, feature_ids):
+    """
+    Mengubah list entry batch menjadi (readings, latest).
+    - feature_ids: {nama_feature: id}
+    - readings: list SensorReading (belum disimpan)
+    - latest: {feature_id: (recorded_at, data)} entry terbaru per feature
+    """
+    readings = []
+    latest = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        recorded_at = parse_timestamp(entry.get("ts"))
+        if recorded_at is None:
+            logger.warning(f"DB> Entry readings tanpa ts valid dari modul {modul.serial_id} diabaikan.")
+            continue
+        for key, feature_name in SENSOR_FEATURES.items():
+            feature_id = feature_ids.get(feature_name)
+            if key not in entry or feature_id is None:
+                continue
+            readings.extend(SensorReading.from_payload(modul.id, feature_id, entry[key], recorded_at))
+            if feature_id not in latest or recorded_at >= latest[feature_id][0]:
+                latest[feature_id] = (recorded_at, entry[key])
+    return readings, latest
+
+
+def write_reading_batch(modul: Modul, entries):
+    """
+    Menyimpan batch data sensor bertimestamp (misal backlog setelah perangkat offline).
+    Format: [{"ts": 1760000000, "temperature_data": [...], "humidity_data": [...]}, ...]
+    - semua reading disimpan ke riwayat dengan satu bulk insert
+    - DataModul hanya diperbarui (satu bulk upsert) untuk feature yang reading batch-nya
+      lebih baru dari riwayat yang sudah ada, agar backlog lama tidak menimpa data live
+    """
+    feature_ids = {name: feature_registry.feature_id(name) for name in SENSOR_FEATURES.values()}
+    readings, latest = collect_batch_readings(modul, entries, feature_ids)
+    if not readings:
+        return 0
+
+    newest_in_history = dict(
+        SensorReading.objects.filter(modul=modul, feature_id__in=latest.keys())
+        .values('feature_id').annotate(last=Max('recorded_at')).values_list('feature_id', 'last')
+    )
+    SensorReading.objects.bulk_create(readings, batch_size=settings.SENSOR_BUFFER_MAX_SIZE)
+
+    data_moduls = [
+        DataModul(modul_id=modul.id, feature_id=feature_id, data=data)
+        for feature_id, (recorded_at, data) in latest.items()
+        if newest_in_history.get(feature_id) is None or recorded_at >= newest_in_history[feature_id]
+    ]
+    if data_moduls:
+        DataModul.objects.bulk_create(
+            data_moduls,
+            update_conflicts=True,
+            unique_fields=['modul', 'feature'],
+            update_fields=['data', 'last_data'],
+        )
+    logger.info(f"DB> {len(readings)} reading batch disimpan untuk modul {modul.serial_id}.")
+    return len(readings)
+
+
+def update_pin_status(modul: Modul, message):
+    """
+    Memperbarui status pin dari payload schedule_data secara bulk.
+    Format: [{"pins": [{"6": "1"}, {"7": "0"}]}]
+    Mengembalikan list ModulePin yang statusnya berubah.
+    """
+    # pin yang tidak terdaftar di modul diabaikan tanpa query (pin map dari cache)
+    pin_map = pin_registry.pin_map(modul.id)
+    states = {pin: status for pin, status in parse_pin_states(message).items() if pin in pin_map}
+    if not states:
+        return []
+    changed = ModulePin.bulk_update_status(modul, states)
+    logger.info(f"DB> {len(changed)} dari {len(states)} status pin diperbarui di modul {modul.serial_id}.")
+    return changed
+
+
+def parse_pin_states(message):
+    """
+    Mengubah payload schedule_data menjadi {nomor_pin: bool}.
+    Format: [{"pins": [{"6": "1"}, {"7": "0"}]}]
+    """
+    pins = next((item.get('pins') for item in message if isinstance(item, dict) and 'pins' in item), None )
+    states = {}
+    for pin in pins or []:
+        for key, value in pin.items():
+            states[int(key)] = value in ("1", 1)
+    return states
+
+
+def write_module_log(modul: Modul, payload: dict):
+    """
+    Membuat ModuleLog baru, atau memperbarui log schedule jika payload membawa id.
+    Update log beserta notifikasinya dikerjakan worker celery (iot.tasks.update_module_log)
+    setelah transaksi commit, consumer tidak ikut menunggu.
+    """
+    # Ekstraksi Value dari payload
+    log_id = payload.get("id")
+    log_type = payload.get("type", "modul")
+    name = payload.get("name")
+    log_data = payload.get("data", {})
+
+    # jika ada id maka dia update log yang sudah ada
+    if type(log_id) == type(123):
+        transaction.on_commit(lambda: update_module_log.delay(log_id=log_id, modul_id=modul.id, log_data=log_data))
+        logger.info(
+            f"DB> Update log {log_id} dikirim ke worker | module={modul.serial_id}"
+        )
+    else:
+        if name == None:
+            name = modul.name
+        ModuleLog.objects.create(
+            module=modul,
+            type=log_type,
+            name=name,
+            data=log_data # Simpan data dict mentah
+        )
+
+        logger.info(
+            f"DB> Log dibuat | module={modul.serial_id} | type={log_type}"
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 15:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0016_modulelog_alarm_at_modulelog_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=50, null=True)),
+                ('value', models.FloatField()),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('feature', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='iot.feature')),
+                ('modul', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='iot.modul')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modul', 'feature', '-recorded_at'], name='iot_reading_modul_feat_ts'), models.Index(fields=['recorded_at'], name='iot_reading_recorded_at')],
+            },
+        ),
+    ]
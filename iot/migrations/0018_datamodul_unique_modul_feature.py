@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+def remove_duplicate_datamodul(apps, schema_editor):
+    """Sisakan hanya DataModul terbaru untuk setiap (modul, feature) sebelum constraint unik dibuat."""
+    DataModul = apps.get_model('iot', 'DataModul')
+    seen = set()
+    duplicate_ids = []
+    for row in DataModul.objects.order_by('modul_id', 'feature_id', '-last_data', '-id').values('id', 'modul_id', 'feature_id'):
+        key = (row['modul_id'], row['feature_id'])
+        if key in seen:
+            duplicate_ids.append(row['id'])
+        else:
+            seen.add(key)
+    if duplicate_ids:
+        DataModul.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0017_sensorreading'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_datamodul, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='datamodul',
+            constraint=models.UniqueConstraint(fields=('modul', 'feature'), name='iot_datamodul_unique_modul_feature'),
+        ),
+    ]
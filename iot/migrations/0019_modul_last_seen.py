@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0018_datamodul_unique_modul_feature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modul',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0019_modul_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modul',
+            name='command_transport',
+            field=models.CharField(choices=[('websocket', 'WebSocket'), ('mqtt', 'MQTT'), ('both', 'WebSocket & MQTT')], default='websocket', max_length=10),
+        ),
+    ]
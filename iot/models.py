@@ -1,9 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from uuid6 import uuid7
 
 # Create your models here.
 
+class CommandTransport(models.TextChoices):
+    WEBSOCKET = "websocket", "WebSocket"
+    MQTT = "mqtt", "MQTT"
+    BOTH = "both", "WebSocket & MQTT"
+
+
 class Modul(models.Model):
     """ Model untuk menyimpan data microcontroller dan generate uuid baru jika uuid bocor """
     serial_id = models.UUIDField(default=uuid7) # menggunakann uuid7 untuk fleksibilitas kedepanya
@@ -14,7 +21,10 @@ class Modul(models.Model):
     name = models.CharField(max_length=50, blank=True, null=True)
     descriptions = models.CharField(max_length=255, blank=True, null=True)
     image = models.FileField()
-    status = models.BooleanField(default=False)
+    status = models.BooleanField(default=False) # online/offline, diperbarui dari presence (iot/presence.py)
+    last_seen = models.DateTimeField(blank=True, null=True)
+    # jalur pengiriman perintah jadwal (alarm) ke perangkat, lihat schedule/tasks.py
+    command_transport = models.CharField(max_length=10, choices=CommandTransport.choices, default=CommandTransport.WEBSOCKET)
     feature = models.ManyToManyField('Feature')
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -22,6 +32,14 @@ class Modul(models.Model):
         self.serial_id = uuid7()
         self.save(update_fields=['serial_id'])
 
+    @property
+    def uses_websocket(self):
+        return self.command_transport in (CommandTransport.WEBSOCKET, CommandTransport.BOTH)
+
+    @property
+    def uses_mqtt(self):
+        return self.command_transport in (CommandTransport.MQTT, CommandTransport.BOTH)
+
     def __str__(self):
         return f"{self.name} - {self.serial_id}"
 
@@ -32,9 +50,71 @@ class DataModul(models.Model):
     data = models.JSONField(blank=True, null=True)
     last_data = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # dibutuhkan untuk bulk upsert (ON CONFLICT) dari buffer data terakhir
+            models.UniqueConstraint(fields=['modul', 'feature'], name='iot_datamodul_unique_modul_feature'),
+        ]
+
     def __str__(self):
         return f"{self.modul.name} - {self.feature.name}"
 
+class SensorReading(models.Model):
+    """
+    Model append-only untuk menyimpan riwayat pembacaan sensor (time-series).
+    DataModul tetap menjadi data terakhir, sedangkan setiap pembacaan disimpan di sini.
+    """
+    # index FK bawaan dimatikan karena sudah tercakup oleh index komposit di bawah (hemat write)
+    modul = models.ForeignKey(Modul, on_delete=models.CASCADE, related_name='readings', db_index=False)
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='readings', db_index=False)
+    name = models.CharField(max_length=50, blank=True, null=True) # nama sensor dari payload, misal "suhu tanah"
+    value = models.FloatField()
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modul', 'feature', '-recorded_at'], name='iot_reading_modul_feat_ts'),
+            models.Index(fields=['recorded_at'], name='iot_reading_recorded_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.modul_id} - {self.feature_id} - {self.recorded_at}"
+
+    @classmethod
+    def from_payload(cls, modul_id, feature_id, message, recorded_at=None):
+        """
+        Mengubah payload sensor dari perangkat menjadi list SensorReading (belum disimpan).
+        Format yang didukung:
+        - [{"name": "value", "data": 45}, ...]
+        - {"name": "value", "data": 45}
+        - 45
+        Nilai yang bukan angka diabaikan.
+        """
+        if recorded_at is None:
+            recorded_at = timezone.now()
+        if isinstance(message, dict):
+            message = [message]
+        elif not isinstance(message, list):
+            message = [{"name": None, "data": message}]
+
+        readings = []
+        for item in message:
+            if not isinstance(item, dict):
+                continue
+            value = item.get("data")
+            # bool adalah turunan int, jangan dianggap angka
+            if isinstance(value, bool):
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            name = item.get("name")
+            if name is not None:
+                name = str(name)[:50] # satu nama kepanjangan jangan sampai menggagalkan satu batch insert
+            readings.append(cls(modul_id=modul_id, feature_id=feature_id, name=name, value=value, recorded_at=recorded_at))
+        return readings
+
 class Feature(models.Model):
     """ Model feature yang hanya dapat dimodifikasi oleh admin """
     name = models.CharField(max_length=50)
@@ -60,6 +140,27 @@ class ModulePin(models.Model):
         self.status = True
         self.save(update_fields=['status'])
 
+    @classmethod
+    def bulk_update_status(cls, module, states):
+        """
+        Memperbarui status banyak pin sekaligus.
+        - states: {nomor_pin: bool}
+        - semua pin modul yang dilaporkan diambil dengan satu query
+        - hanya pin yang statusnya berubah yang ditulis dengan satu bulk_update (CASE WHEN)
+        Mengembalikan list ModulePin yang berubah.
+        """
+        if not states:
+            return []
+        changed = []
+        for module_pin in cls.objects.filter(module=module, pin__in=states.keys()):
+            status = states[module_pin.pin]
+            if module_pin.status != status:
+                module_pin.status = status
+                changed.append(module_pin)
+        if changed:
+            cls.objects.bulk_update(changed, ['status'])
+        return changed
+
     def __str__(self):
         return f"{self.module.serial_id} - {self.pin}"
     
@@ -0,0 +1,267 @@
+"""
+Ingest frame perangkat lewat MQTT (alternatif websocket untuk perangkat dengan daya/jaringan terbatas).
+Topic:
+- devices/<serial_id>/data            -> frame JSON
+- devices/<serial_id>/data/<encoding> -> frame biner msgpack/cbor (lihat iot/codec.py)
+Isi frame sama dengan websocket dan wajib membawa {"device": "<auth_id>"}.
+Frame disimpan lewat pipeline yang sama dengan DeviceAuthConsumer (iot.ingest.persist_device_frame)
+lalu di-broadcast ke grup websocket grup_<serial_id>.
+Subscriber bisa diperbanyak (beberapa proses) dengan shared subscription $share/<group>/... (MQTT v5).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import queue
+import signal
+from concurrent.futures import ThreadPoolExecutor
+import paho.mqtt.client as mqtt
+from cachetools import TTLCache
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections
+from iot import ingest, presence
+from iot.buffers import flush_sensor_buffers
+from iot.broadcast import broadcast_device_frame
+from iot.codec import decode_frame, available_encodings, FrameDecodeError, JSON
+
+logger = logging.getLogger(__name__)
+
+DEVICE_DATA_TOPICS = ["devices/+/data", "devices/+/data/+"]
+SENDER_CHANNEL_NAME = "mqtt_ingest"
+
+# modul dicache sebentar agar setiap pesan tidak perlu query modul
+_moduls = TTLCache(maxsize=10000, ttl=60)
+# presence cukup diperbarui sekali per DEVICE_PRESENCE_TOUCH_INTERVAL per modul
+_touched = TTLCache(maxsize=10000, ttl=settings.DEVICE_PRESENCE_TOUCH_INTERVAL)
+
+
+class DeviceFrame:
+    """Frame perangkat yang sudah tersimpan dan siap di-broadcast."""
+
+    def __init__(self, modul, data, payload_string):
+        self.modul = modul
+        self.data = data
+        self.payload_string = payload_string
+        self.group_name = f"grup_{modul.serial_id}"
+
+
+def parse_topic(topic):
+    """devices/<serial_id>/data[/<encoding>] -> (serial_id, encoding), None jika bukan topic data."""
+    parts = topic.split('/')
+    if len(parts) not in (3, 4) or parts[0] != 'devices' or parts[2] != 'data':
+        return None
+    encoding = parts[3].lower() if len(parts) == 4 else JSON
+    if encoding not in available_encodings():
+        return None
+    return parts[1], encoding
+
+
+def get_modul(serial_id):
+    modul = _moduls.get(serial_id)
+    if modul is None:
+        modul = ingest.get_modul(serial_id)
+        if modul is not None:
+            _moduls[serial_id] = modul
+    return modul
+
+
+def process_device_message(topic, payload):
+    """
+    Decode, otentikasi dan simpan satu pesan MQTT (sync, satu transaksi seperti websocket).
+    Mengembalikan DeviceFrame untuk di-broadcast, None jika pesan ditolak.
+    """
+    parsed = parse_topic(topic)
+    if parsed is None:
+        logger.warning(f"MQTT> Topic tidak dikenal: {topic}")
+        return None
+    serial_id, encoding = parsed
+
+    try:
+        if encoding == JSON:
+            data = decode_frame(text_data=payload)
+        else:
+            data = decode_frame(bytes_data=payload, encoding=encoding)
+    except FrameDecodeError as e:
+        logger.error(f"MQTT> Frame ({encoding}) dari {serial_id} tidak valid: {e}")
+        return None
+    if not isinstance(data, dict):
+        logger.warning(f"MQTT> Payload dari {serial_id} bukan dictionary.")
+        return None
+
+    try:
+        modul = get_modul(serial_id)
+    except Exception as e:
+        # serial_id bukan uuid valid
+        logger.warning(f"MQTT> Modul {serial_id} tidak valid: {e}")
+        return None
+    if modul is None:
+        logger.warning(f"MQTT> Modul dengan serial_id {serial_id} tidak ditemukan.")
+        return None
+
+    auth_id = str(data.get("device", ""))
+    if not hmac.compare_digest(str(modul.auth_id).encode(), auth_id.encode()):
+        logger.warning(f"MQTT-SECURITY> Device Auth Gagal. ID: {serial_id}, Input: {auth_id}")
+        return None
+
+    result = ingest.persist_device_frame(modul, data)
+    for key, error in result["errors"].items():
+        logger.error(f"MQTT-TASK> Error pada {key}: {error}")
+    if modul.id not in _touched:
+        _touched[modul.id] = True
+        presence.touch(modul.id)
+
+    payload_string = payload.decode('utf-8', 'replace') if encoding == JSON else json.dumps(data, default=str)
+    return DeviceFrame(modul, data, payload_string)
+
+
+async def broadcast_frame(frame, channel_layer=None):
+    """Broadcast frame ke user grup websocket modul (delta telemetry sama seperti websocket)."""
+    channel_layer = channel_layer or get_channel_layer()
+
+    async def send(message, kind):
+        await channel_layer.group_send(frame.group_name, {
+            'type': 'channel.message',
+            'message': message,
+            'sender_channel_name': SENDER_CHANNEL_NAME,
+            'kind': kind,
+        })
+
+    await broadcast_device_frame(frame.group_name, frame.data, frame.payload_string, send)
+
+
+class MqttIngestWorker:
+    """
+    Satu proses subscriber MQTT.
+    - thread jaringan paho hanya memasukkan pesan ke antrian berbatas (tidak pernah menunggu database/redis)
+    - satu thread database mengambil pesan per batch, menyimpan berurutan (urutan per perangkat terjaga)
+    - event loop asyncio mengirim hasil batch ke channel layer secara bersamaan
+    Jika antrian penuh pesan baru dibuang dan dihitung (lihat `dropped`).
+    SIGTERM/SIGINT menghentikan worker dengan rapi: putus dari broker, sisa antrian diproses,
+    lalu buffer sensor di-flush (atexit tidak berjalan saat proses dihentikan dengan signal).
+    """
+
+    def __init__(self, host, port, keepalive, shared_group=None, queue_size=None, batch_size=None, name="mqtt-ingest"):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.shared_group = shared_group
+        self.batch_size = batch_size or settings.MQTT_INGEST_BATCH_SIZE
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size or settings.MQTT_INGEST_QUEUE_SIZE)
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self._stopping = False
+
+    def stop(self):
+        if not self._stopping:
+            logger.info(f"MQTT> {self.name} berhenti, menyelesaikan {self.queue.qsize()} pesan tersisa...")
+        self._stopping = True
+
+    @property
+    def topics(self):
+        if self.shared_group:
+            return [f"$share/{self.shared_group}/{topic}" for topic in DEVICE_DATA_TOPICS]
+        return list(DEVICE_DATA_TOPICS)
+
+    def run(self):
+        """Blocking, berjalan sampai proses dihentikan."""
+        # shared subscription adalah fitur MQTT v5
+        protocol = mqtt.MQTTv5 if self.shared_group else mqtt.MQTTv311
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, protocol=protocol)
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        client.connect_async(self.host, self.port, self.keepalive)
+        client.loop_start()
+        try:
+            asyncio.run(self.dispatch(client))
+        finally:
+            client.disconnect()
+            client.loop_stop()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"MQTT> {self.name} gagal terhubung ke broker: {reason_code}")
+            return
+        # subscribe ulang setiap (re)connect
+        client.subscribe([(topic, 1) for topic in self.topics])
+        logger.info(f"MQTT> {self.name} terhubung, subscribe: {', '.join(self.topics)}")
+
+    def on_message(self, client, userdata, msg):
+        self.received += 1
+        try:
+            self.queue.put_nowait((msg.topic, msg.payload))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"MQTT> {self.name} antrian penuh ({self.queue.maxsize}), {self.dropped} pesan dibuang.")
+
+    def take_batch(self, timeout=1.0):
+        """Ambil hingga batch_size pesan (menunggu paling lama `timeout` untuk pesan pertama) lalu simpan."""
+        try:
+            items = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # proses ini berjalan lama, buang koneksi database yang sudah kadaluarsa
+        close_old_connections()
+        frames = []
+        for topic, payload in items:
+            try:
+                frame = process_device_message(topic, payload)
+            except Exception as e:
+                logger.exception(f"MQTT-CRITICAL> Error tak terduga pada topic {topic}: {e}")
+                continue
+            if frame is not None:
+                frames.append(frame)
+        self.processed += len(items)
+        return frames
+
+    async def dispatch(self, client):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+        channel_layer = get_channel_layer()
+        # satu thread -> satu koneksi database dan frame disimpan sesuai urutan diterima
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        pending = set()
+        try:
+            while not self._stopping:
+                # database di thread sendiri, broadcast batch sebelumnya tetap berjalan di event loop
+                frames = await loop.run_in_executor(executor, self.take_batch)
+                pending = {task for task in pending if not task.done()}
+                if len(pending) >= self.batch_size * 4:
+                    # channel layer lambat, tahan pengambilan batch berikutnya (antrian yang menampung)
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                self._broadcast(frames, channel_layer, pending)
+
+            # tidak menerima pesan baru lagi, pesan di antrian sudah di-ACK broker jadi tetap diproses
+            client.disconnect()
+            while not self.queue.empty():
+                frames = await loop.run_in_executor(executor, self.take_batch, 0)
+                self._broadcast(frames, channel_layer, pending)
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            # di thread database yang sama agar koneksi database-nya dipakai ulang
+            written = await loop.run_in_executor(executor, flush_sensor_buffers)
+            executor.shutdown()
+            logger.info(f"MQTT> {self.name} flush buffer sensor: {written} baris.")
+
+    def _broadcast(self, frames, channel_layer, pending):
+        for frame in frames:
+            task = asyncio.ensure_future(broadcast_frame(frame, channel_layer))
+            task.add_done_callback(self._log_broadcast_error)
+            pending.add(task)
+
+    @staticmethod
+    def _log_broadcast_error(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"MQTT> Gagal broadcast frame: {task.exception()}")
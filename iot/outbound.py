@@ -0,0 +1,120 @@
+"""
+Antrian kirim (outbound) per koneksi websocket.
+Client dengan jaringan lambat tidak boleh membuat pesan menumpuk tanpa batas di proses server:
+- setiap koneksi punya antrian dengan batas `WS_SEND_QUEUE_MAX` pesan
+- jika penuh, telemetry paling lama dibuang lebih dulu (sudah digantikan telemetry yang lebih baru,
+  client akan melihat loncatan `seq` lalu meminta resync)
+- pesan command/log/schedule TIDAK pernah dibuang
+Antrian hanya terisi jika server ASGI menahan send() saat buffer socket client penuh (backpressure).
+uvicorn (--ws websockets) melakukannya, daphne tidak (send selalu langsung selesai), lihat Dockerfile.
+"""
+import asyncio
+import logging
+from collections import Counter, deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# jenis pesan (key `kind` pada event channel layer)
+TELEMETRY = "telemetry"
+COMMAND = "command"
+
+# counter seluruh koneksi di proses ini
+_counters = Counter()
+_queues = set()
+
+
+class OutboundQueue:
+    """
+    Antrian pesan keluar satu koneksi, dikirim berurutan oleh satu task writer.
+    - send: coroutine function send(text_data=...) milik consumer
+    """
+
+    def __init__(self, send, max_size=None):
+        self._send = send
+        self.max_size = max_size if max_size is not None else settings.WS_SEND_QUEUE_MAX
+        self._items = deque()
+        self._telemetry_count = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+            _queues.add(self)
+
+    def put(self, message, kind=COMMAND):
+        """Masukkan pesan ke antrian, mengembalikan False jika pesan telemetry dibuang."""
+        if self.max_size and len(self._items) >= self.max_size:
+            if self._telemetry_count:
+                self._drop_oldest_telemetry()
+            elif kind == TELEMETRY:
+                self._count_drop()
+                return False
+            else:
+                # antrian penuh oleh command, command tetap masuk
+                _counters["command_overflow"] += 1
+
+        self._items.append((kind, message))
+        if kind == TELEMETRY:
+            self._telemetry_count += 1
+        _counters["queued"] += 1
+        _counters["max_depth"] = max(_counters["max_depth"], len(self._items))
+        self._wakeup.set()
+        return True
+
+    async def close(self):
+        """Hentikan writer, pesan yang belum terkirim dibuang (koneksi sudah ditutup)."""
+        _queues.discard(self)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._items.clear()
+        self._telemetry_count = 0
+
+    def _drop_oldest_telemetry(self):
+        for index, (kind, _) in enumerate(self._items):
+            if kind == TELEMETRY:
+                del self._items[index]
+                self._telemetry_count -= 1
+                self._count_drop()
+                return
+
+    def _count_drop(self):
+        self.dropped += 1
+        _counters["dropped"] += 1
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            while self._items:
+                kind, message = self._items.popleft()
+                if kind == TELEMETRY:
+                    self._telemetry_count -= 1
+                try:
+                    await self._send(text_data=message)
+                    _counters["sent"] += 1
+                except Exception as e:
+                    logger.error(f"WS> Gagal mengirim pesan ke client: {e}")
+            self._wakeup.clear()
+
+
+def outbound_queue_stats():
+    """Metrik antrian kirim seluruh koneksi di proses ini."""
+    return {
+        "connections": len(_queues),
+        "depth": sum(len(queue) for queue in _queues),
+        "queued": _counters["queued"],
+        "sent": _counters["sent"],
+        "dropped": _counters["dropped"],
+        "command_overflow": _counters["command_overflow"],
+        "max_depth": _counters["max_depth"],
+    }
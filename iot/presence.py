@@ -0,0 +1,85 @@
+"""
+Presence perangkat (online/offline & last seen).
+Consumer hanya menulis ke redis, database diperbarui berkala secara bulk oleh task celery
+flush_device_presence, jadi tidak ada query database per frame.
+- iot:presence:last_seen (sorted set) -> member modul_id, score waktu pesan terakhir (unix epoch)
+- iot:presence:disconnected (set)      -> modul_id yang koneksi websocket-nya sudah ditutup
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from smartfarming.utils.redis import get_redis, get_async_redis
+from iot.models import Modul
+
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_KEY = "iot:presence:last_seen"
+DISCONNECTED_KEY = "iot:presence:disconnected"
+
+
+async def amark_online(modul_id):
+    """Perangkat terotentikasi (koneksi baru)."""
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            await pipe.zadd(LAST_SEEN_KEY, {modul_id: time.time()}).srem(DISCONNECTED_KEY, modul_id).execute()
+    except Exception as e:
+        logger.warning(f"PRESENCE> Gagal menandai modul {modul_id} online: {e}")
+
+
+async def atouch(modul_id):
+    """
+    Perbarui last seen (dipanggil consumer dengan jeda DEVICE_PRESENCE_TOUCH_INTERVAL).
+    Tanda disconnected ikut dihapus: disconnect koneksi lama bisa datang setelah koneksi baru terotentikasi.
+    """
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            await pipe.zadd(LAST_SEEN_KEY, {modul_id: time.time()}).srem(DISCONNECTED_KEY, modul_id).execute()
+    except Exception as e:
+        logger.warning(f"PRESENCE> Gagal memperbarui last seen modul {modul_id}: {e}")
+
+
+async def amark_offline(modul_id):
+    """Koneksi perangkat ditutup."""
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            await pipe.zadd(LAST_SEEN_KEY, {modul_id: time.time()}).sadd(DISCONNECTED_KEY, modul_id).execute()
+    except Exception as e:
+        logger.warning(f"PRESENCE> Gagal menandai modul {modul_id} offline: {e}")
+
+
+def touch(modul_id):
+    """Versi sync dari atouch, untuk perangkat yang tidak memakai koneksi websocket (misal MQTT)."""
+    try:
+        get_redis().pipeline(transaction=False).zadd(LAST_SEEN_KEY, {modul_id: time.time()}).srem(DISCONNECTED_KEY, modul_id).execute()
+    except Exception as e:
+        logger.warning(f"PRESENCE> Gagal memperbarui last seen modul {modul_id}: {e}")
+
+
+def flush_presence():
+    """
+    Tulis presence dari redis ke database secara bulk.
+    - modul yang terlihat dalam DEVICE_PRESENCE_TIMEOUT terakhir: last_seen diperbarui,
+      status online kecuali koneksinya sudah ditutup
+    - modul lain yang masih berstatus online (diam terlalu lama) ditandai offline dengan satu UPDATE
+    Mengembalikan (jumlah online, jumlah yang ditandai offline).
+    """
+    client = get_redis()
+    threshold = time.time() - settings.DEVICE_PRESENCE_TIMEOUT
+    pipe = client.pipeline(transaction=False)
+    pipe.zrangebyscore(LAST_SEEN_KEY, threshold, "+inf", withscores=True)
+    pipe.smembers(DISCONNECTED_KEY)
+    recent, disconnected = pipe.execute()
+
+    moduls = [
+        Modul(
+            id=int(member),
+            status=member not in disconnected,
+            last_seen=datetime.fromtimestamp(score, tz=dt_timezone.utc),
+        )
+        for member, score in recent
+    ]
+    Modul.objects.bulk_update(moduls, ['status', 'last_seen'], batch_size=500)
+    online_ids = [modul.id for modul in moduls if modul.status]
+    offline = Modul.objects.filter(status=True).exclude(id__in=online_ids).update(status=False)
+    return len(online_ids), offline
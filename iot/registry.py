@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from iot.models import Feature, Modul, ModulePin
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureRegistry:
+    """
+    Cache in-process untuk data Feature yang jarang berubah (hanya diubah admin):
+    - nama feature -> id
+    - daftar fitur yang dimiliki setiap modul (capability)
+
+    Setiap proses menyimpan salinannya sendiri. Perubahan (lihat iot/signals.py) menaikkan
+    versi di cache bersama (Redis), proses lain akan membuang salinannya ketika
+    versi yang dilihat berbeda. Versi dicek paling sering setiap `check_interval` detik.
+    """
+    VERSION_KEY = "iot:feature-registry:version"
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._features = None
+        self._capabilities = {}
+
+    def feature_id(self, name):
+        """Mengembalikan id Feature berdasarkan nama, None jika tidak ada."""
+        self._sync()
+        features = self._features
+        if features is None:
+            features = {}
+            # jika ada nama ganda, id terkecil yang dipakai
+            for feature_id, feature_name in Feature.objects.order_by('-id').values_list('id', 'name'):
+                features[feature_name] = feature_id
+            with self._lock:
+                self._features = features
+        return features.get(name)
+
+    async def afeature_id(self, name):
+        """
+        Versi async dari feature_id().
+        Hanya pindah ke thread jika salinan lokal perlu dimuat/dicek ulang.
+        """
+        features = self._features
+        if features is not None and not self._needs_sync():
+            return features.get(name)
+        return await sync_to_async(self.feature_id)(name)
+
+    def module_features(self, modul_id):
+        """Mengembalikan frozenset nama fitur (lowercase) yang dimiliki modul."""
+        self._sync()
+        capabilities = self._capabilities.get(modul_id)
+        if capabilities is None:
+            names = Modul.feature.through.objects.filter(modul_id=modul_id).values_list('feature__name', flat=True)
+            capabilities = frozenset(name.lower() for name in names)
+            with self._lock:
+                self._capabilities[modul_id] = capabilities
+        return capabilities
+
+    def module_has_feature(self, modul_id, name):
+        """Cek apakah modul memiliki fitur `name` (case-insensitive)."""
+        return name.lower() in self.module_features(modul_id)
+
+    def invalidate(self):
+        """Buang cache di proses ini dan beri tahu proses lain dengan menaikkan versi."""
+        self._clear()
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            # key belum ada di cache
+            cache.set(self.VERSION_KEY, 1, timeout=None)
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal menaikkan versi feature registry: {e}")
+        self._checked_at = 0.0
+
+    def _clear(self):
+        with self._lock:
+            self._features = None
+            self._capabilities = {}
+
+    def _needs_sync(self):
+        return time.monotonic() - self._checked_at >= self.check_interval
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        try:
+            version = cache.get(self.VERSION_KEY)
+        except Exception as e:
+            # cache bersama tidak bisa diakses, pakai salinan lokal sampai pengecekan berikutnya
+            logger.warning(f"CACHE> Gagal membaca versi feature registry: {e}")
+            self._checked_at = now
+            return
+        if version != self._version:
+            self._clear()
+            self._version = version
+        self._checked_at = now
+
+
+class PinRegistry:
+    """
+    Cache bersama (Redis) metadata pin per modul: {nomor_pin: {"id", "name", "type", "group_id"}}.
+    Dipakai untuk mengganti nomor pin dengan nama di log, menyaring pin di schedule_data
+    dan mencari pin milik grup saat alarm dipicu. Status pin TIDAK ikut di-cache karena sering berubah.
+    Dibuang setiap ModulePin disimpan/dihapus atau grup schedule dihapus (lihat iot/signals.py).
+    """
+    KEY = "iot:pin-map:{}"
+    TIMEOUT = 60 * 60 * 24
+
+    def pin_map(self, modul_id):
+        key = self.KEY.format(modul_id)
+        try:
+            pins = cache.get(key)
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal membaca pin map modul {modul_id}: {e}")
+            return self._load(modul_id)
+        if pins is None:
+            pins = self._load(modul_id)
+            try:
+                cache.set(key, pins, timeout=self.TIMEOUT)
+            except Exception as e:
+                logger.warning(f"CACHE> Gagal menyimpan pin map modul {modul_id}: {e}")
+        return pins
+
+    async def apin_map(self, modul_id):
+        """Versi async dari pin_map(), hanya pindah ke thread jika cache kosong."""
+        try:
+            pins = await cache.aget(self.KEY.format(modul_id))
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal membaca pin map modul {modul_id}: {e}")
+            pins = None
+        if pins is None:
+            pins = await sync_to_async(self.pin_map)(modul_id)
+        return pins
+
+    def pin_maps(self, modul_ids):
+        """
+        Pin map banyak modul sekaligus {modul_id: pin_map} (dispatch alarm batch):
+        satu get_many ke cache dan paling banyak satu query untuk modul yang belum ada di cache.
+        """
+        keys = {self.KEY.format(modul_id): modul_id for modul_id in set(modul_ids)}
+        try:
+            cached = cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal membaca pin map {len(keys)} modul: {e}")
+            cached = {}
+        maps = {keys[key]: pins for key, pins in cached.items()}
+
+        missing = [modul_id for modul_id in keys.values() if modul_id not in maps]
+        if missing:
+            loaded = {modul_id: {} for modul_id in missing}
+            for pin_id, modul_id, pin, name, pin_type, group_id in ModulePin.objects.filter(module_id__in=missing) \
+                    .order_by('id').values_list('id', 'module_id', 'pin', 'name', 'type', 'group_id'):
+                loaded[modul_id][pin] = {"id": pin_id, "name": name, "type": pin_type, "group_id": group_id}
+            try:
+                cache.set_many({self.KEY.format(modul_id): pins for modul_id, pins in loaded.items()}, timeout=self.TIMEOUT)
+            except Exception as e:
+                logger.warning(f"CACHE> Gagal menyimpan pin map {len(loaded)} modul: {e}")
+            maps.update(loaded)
+        return maps
+
+    def pin_names(self, modul_id):
+        """Mapping {nomor_pin: nama} untuk rename pin di log."""
+        return {pin: meta["name"] for pin, meta in self.pin_map(modul_id).items()}
+
+    def group_pins(self, modul_id, group_id, pins=None):
+        """Nomor pin (urut) milik grup schedule, `pins` = pin map yang sudah dimuat (lihat pin_maps)."""
+        pins = self.pin_map(modul_id) if pins is None else pins
+        return sorted(pin for pin, meta in pins.items() if meta["group_id"] == group_id)
+
+    def invalidate(self, modul_id):
+        try:
+            cache.delete(self.KEY.format(modul_id))
+        except Exception as e:
+            logger.warning(f"CACHE> Gagal menghapus pin map modul {modul_id}: {e}")
+
+    def _load(self, modul_id):
+        return {
+            pin: {"id": pin_id, "name": name, "type": pin_type, "group_id": group_id}
+            for pin_id, pin, name, pin_type, group_id in ModulePin.objects.filter(module_id=modul_id)
+                .order_by('id').values_list('id', 'pin', 'name', 'type', 'group_id')
+        }
+
+
+feature_registry = FeatureRegistry(check_interval=settings.FEATURE_REGISTRY_CHECK_INTERVAL)
+pin_registry = PinRegistry()
@@ -31,8 +31,8 @@ class ModulSerializers(serializers.ModelSerializer):
     
     class Meta:
         model = Modul
-        fields = ['id','type','user', 'serial_id','auth_id', 'name', 'descriptions','image', 'feature','password', 'created_at']
-        read_only_fields = ['serial_id','auth_id', 'created_at']
+        fields = ['id','type','user', 'serial_id','auth_id', 'name', 'descriptions','image', 'feature','password', 'status', 'last_seen', 'command_transport', 'created_at']
+        read_only_fields = ['serial_id','auth_id', 'status', 'last_seen', 'created_at']
 
     def get_feature(self, modul_obj):
         """
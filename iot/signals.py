@@ -0,0 +1,89 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from iot.models import Feature, Modul, ModulePin
+from iot.registry import feature_registry, pin_registry
+from schedule.models import GroupSchedule
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_delete, sender=Modul)
+def invalidate_feature_registry(sender, **kwargs):
+    """Feature diubah/dihapus atau modul dihapus, buang cache feature registry."""
+    feature_registry.invalidate()
+
+
+@receiver(m2m_changed, sender=Modul.feature.through)
+def invalidate_module_capabilities(sender, action, **kwargs):
+    """Fitur modul ditambah/dihapus, buang cache feature registry."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        feature_registry.invalidate()
+
+
+@receiver(post_save, sender=ModulePin)
+@receiver(post_delete, sender=ModulePin)
+def invalidate_pin_map(sender, instance, **kwargs):
+    """Pin modul diubah/dihapus, buang pin map modul tersebut setelah transaksi commit."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) <= {'status'}:
+        # set_on/set_off hanya mengubah status, status tidak ada di pin map
+        return
+    transaction.on_commit(lambda: pin_registry.invalidate(instance.module_id))
+
+
+@receiver(post_delete, sender=GroupSchedule)
+def invalidate_group_pin_map(sender, instance, **kwargs):
+    """Grup dihapus, group pin di-set NULL lewat database (tanpa signal ModulePin)."""
+    transaction.on_commit(lambda: pin_registry.invalidate(instance.modul_id))
+
+
+def notify_membership_revoked(serial_id, user_ids):
+    """
+    Kirim event membership.revoked ke grup websocket modul setelah transaksi commit,
+    agar koneksi user yang dicabut langsung kehilangan akses (lihat DeviceAuthConsumer).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def send():
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                f'grup_{serial_id}',
+                {'type': 'membership.revoked', 'user_ids': user_ids}
+            )
+        except Exception as e:
+            logger.error(f"WS> Gagal mengirim pencabutan akses modul {serial_id}: {e}")
+
+    transaction.on_commit(send)
+
+
+@receiver(m2m_changed, sender=Modul.user.through)
+def revoke_module_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """User dikeluarkan dari modul (modul.user.remove/clear atau user.modul_set.remove/clear)."""
+    if action == "pre_clear":
+        # simpan daftar relasi sebelum dihapus, karena post_clear tidak membawa pk_set
+        if reverse:
+            instance._cleared_modul_ids = list(instance.modul_set.values_list('id', flat=True))
+        else:
+            instance._cleared_user_ids = list(instance.user.values_list('id', flat=True))
+        return
+
+    if action not in ("post_remove", "post_clear"):
+        return
+
+    if reverse:
+        # instance adalah User, pk_set berisi id modul
+        modul_ids = pk_set if action == "post_remove" else getattr(instance, '_cleared_modul_ids', [])
+        for serial_id in Modul.objects.filter(id__in=modul_ids).values_list('serial_id', flat=True):
+            notify_membership_revoked(serial_id, [instance.pk])
+    else:
+        # instance adalah Modul, pk_set berisi id user
+        user_ids = pk_set if action == "post_remove" else getattr(instance, '_cleared_user_ids', [])
+        notify_membership_revoked(instance.serial_id, user_ids)
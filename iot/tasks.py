@@ -0,0 +1,67 @@
+import logging
+from celery import shared_task
+from django.contrib.auth.models import User
+from iot.models import ModuleLog
+from iot.presence import flush_presence
+from iot.registry import pin_registry
+from profil.models import NotificationType, Notification
+from smartfarming.tasks import task_broadcast_module_notification
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="flush_device_presence")
+def flush_device_presence():
+    """
+    Dijalankan Beat setiap 30 detik (lihat smartfarming/celery.py).
+    Menyalin presence perangkat dari redis ke Modul.status & Modul.last_seen secara bulk.
+    """
+    online, offline = flush_presence()
+    logger.info(f"PRESENCE> {online} modul online, {offline} modul ditandai offline.")
+
+
+def rename_log_pins(pins, pin_map):
+    """
+    Ganti nomor pin di dalam list pins log dengan nama pin (in-place).
+    Mapping: {6: "relay 1", 7: "relay 2"}
+    """
+    for p in pins:
+        original_pin = p.get("pin")
+        # Ganti angka dengan nama jika ada di map, jika tidak biarkan angkanya
+        if original_pin in pin_map:
+            p["pin"] = pin_map[original_pin]
+
+
+@shared_task(name="update_module_log")
+def update_module_log(log_id, modul_id, log_data):
+    """
+    Memperbarui ModuleLog schedule dari laporan perangkat lalu mengirim notifikasi ke semua user modul.
+    Jumlah query tetap berapapun jumlah pin/user:
+    log + schedule (1), user modul (1), update log (1), bulk insert notifikasi (1),
+    ditambah pin modul (1) hanya jika pin map belum ada di cache.
+    """
+    try:
+        update_log = ModuleLog.objects.select_related('schedule').get(id=log_id, module_id=modul_id)
+    except ModuleLog.DoesNotExist:
+        logger.warning(f"DB> ModuleLog {log_id} untuk modul {modul_id} tidak ditemukan.")
+        return
+
+    # Update nilai pin di dalam list pins
+    # Karena 'pins' adalah referensi ke dalam 'log_data',
+    # mengubah 'p' berarti mengubah isi 'log_data' juga.
+    pins = log_data.get("pins", [])
+    rename_log_pins(pins, pin_registry.pin_names(modul_id))
+
+    # Simpan 'log_data' yang strukturnya sudah benar & terupdate
+    update_log.data = log_data
+    update_log.save(update_fields=['data', 'updated_at'])
+
+    users = list(User.objects.filter(modul=modul_id).only('id'))
+    message = log_data.get("message", "IoT sedang menjalankan tugas")
+    schedule_name = update_log.schedule.name if update_log.schedule else update_log.name
+    title = f"Informasi Penjadwalan {schedule_name}"
+    Notification.bulk_create_for_users(users=users, notif_type=NotificationType.SCHEDULE, title=title, body=message, data=log_data)
+    task_broadcast_module_notification.delay(
+        user_ids=[user.id for user in users], modul_id=modul_id, title=title, body=message, data=log_data
+    )
+    logger.info(f"DB> Log diperbarui | module={modul_id} | type={update_log.type}")
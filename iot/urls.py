@@ -9,6 +9,7 @@ urlpatterns = [
     # admin
     path("admin/device/", DeviceListAdminView.as_view(), name="device-iot"),
     path("admin/device/<int:pk>/", DeviceDetailAdminView.as_view(), name="delete-device-iot"),
+    path("admin/metrics/", ServerMetricsAdminView.as_view(), name="server-metrics"),
 
     # device
     path("device/<uuid:serial_id>/", ModulUserView.as_view(), name="device-detail"),
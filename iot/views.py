@@ -17,6 +17,8 @@ from .models import *
 from .serializers import *
 from schedule.models import GroupSchedule
 from schedule.serializers import GroupScheduleSerializer
+from .buffers import sensor_buffer_stats
+from .outbound import outbound_queue_stats
 
 class DeviceListAdminView(APIView):
     """
@@ -65,6 +67,25 @@ class DeviceDetailAdminView(APIView):
         return CustomResponse(success=True, message=f"Modul dengan id {pk} berhasil dihapus", status=status.HTTP_200_OK, request=request)
 
 
+class ServerMetricsAdminView(APIView):
+    """
+    Endpoint metrik runtime proses server yang melayani request ini (hanya admin / is_staff).
+
+    - GET:
+        outbound_queue: antrian kirim websocket (pesan diantrikan, terkirim, dibuang, kedalaman).
+        sensor_buffers: write-behind buffer sensor (kedalaman, jumlah flush, latensi flush, item dibuang).
+        Metrik disimpan per proses, dengan beberapa worker server setiap request bisa mendapat proses berbeda.
+    """
+    permission_classes = [IsAuthenticated, AdminOnlyGet]
+
+    def get(self, request):
+        data = {
+            "outbound_queue": outbound_queue_stats(),
+            "sensor_buffers": sensor_buffer_stats(),
+        }
+        return CustomResponse(success=True, status=status.HTTP_200_OK, message="Success", data=data, request=request)
+
+
 class ModulUserView(APIView):
     """
     Endpoint untuk mengelola relasi user dengan Modul tertentu.
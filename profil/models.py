@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from smartfarming.tasks import task_send_push_notification
+from smartfarming.utils.user_cache import invalidate_cached_user
 
 # Create your models here.
 
@@ -21,6 +22,14 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.get_or_create(user=instance)
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Hapus user dari cache autentikasi websocket setiap kali user diubah, dinonaktifkan atau dihapus
+    """
+    invalidate_cached_user(instance.pk)
+
 @receiver(pre_save, sender=UserProfile)
 def delete_old_profile_image_on_update(sender, instance, **kwargs):
     """
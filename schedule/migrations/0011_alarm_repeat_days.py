@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 16:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+REPEAT_FIELDS = [
+    'repeat_monday', 'repeat_tuesday', 'repeat_wednesday',
+    'repeat_thursday', 'repeat_friday', 'repeat_saturday', 'repeat_sunday',
+]
+
+
+def fill_repeat_days(apps, schema_editor):
+    """Isi repeat_days dari field repeat_* yang sudah ada, satu UPDATE per hari."""
+    Alarm = apps.get_model('schedule', 'Alarm')
+    for day, field in enumerate(REPEAT_FIELDS):
+        Alarm.objects.filter(**{field: True}).update(repeat_days=F('repeat_days').bitor(1 << day))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0010_groupschedule_sequential'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarm',
+            name='repeat_days',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_repeat_days, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alarm',
+            index=models.Index(fields=['is_active', 'time'], name='schedule_alarm_active_time_idx'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth.models import User
 from iot.models import Modul
     
@@ -9,7 +11,13 @@ class GroupSchedule(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.modul.name}"
-    
+
+# urutan sesuai datetime.weekday() (Senin=0, ..., Minggu=6), bit ke-i di Alarm.repeat_days
+REPEAT_FIELDS = [
+    'repeat_monday', 'repeat_tuesday', 'repeat_wednesday',
+    'repeat_thursday', 'repeat_friday', 'repeat_saturday', 'repeat_sunday',
+]
+
 class Alarm(models.Model):
     """
     Mewakili satu entitas alaram yang diatur oleh pengguna.
@@ -32,6 +40,8 @@ class Alarm(models.Model):
     repeat_friday = models.BooleanField(default=False)
     repeat_saturday = models.BooleanField(default=False)
     repeat_sunday = models.BooleanField(default=False)
+    # bitmask dari repeat_* (bit 0 = Senin), diisi otomatis di save() agar pengecekan hari bisa dilakukan di SQL
+    repeat_days = models.PositiveSmallIntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -40,15 +50,61 @@ class Alarm(models.Model):
         ordering = ['time']
         verbose_name = "Alaram"
         verbose_name_plural = "Daftar Alaram"
+        indexes = [
+            # pencarian alaram jatuh tempo (Alarm.due_at)
+            models.Index(fields=['is_active', 'time'], name='schedule_alarm_active_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.label or 'Alaram'} - {self.time.strftime('%H:%M')} ({self.group.name})"
 
+    def save(self, *args, **kwargs):
+        self.repeat_days = self.weekday_mask
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(REPEAT_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'repeat_days'}
+        super().save(*args, **kwargs)
+
+    @property
+    def weekday_mask(self):
+        """Bitmask hari pengulangan dari field repeat_* (bit 0 = Senin)."""
+        return sum(1 << day for day, field in enumerate(REPEAT_FIELDS) if getattr(self, field))
+
     @property
     def is_repeating(self):
         """Properti untuk mengecek apakah alaram ini memiliki jadwal pengulangan."""
-        return any([
-            self.repeat_monday, self.repeat_tuesday, self.repeat_wednesday,
-            self.repeat_thursday, self.repeat_friday, self.repeat_saturday,
-            self.repeat_sunday
-        ])
\ No newline at end of file
+        return self.weekday_mask != 0
+
+    def runs_on(self, weekday):
+        """Apakah alaram berbunyi pada hari `weekday` (Senin=0, ..., Minggu=6). Alaram sekali jalan berbunyi di hari apa pun."""
+        mask = self.weekday_mask
+        return not mask or bool(mask & (1 << weekday))
+
+    @classmethod
+    def due_at(cls, moment):
+        """
+        Alaram aktif yang berbunyi pada menit `moment` (UTC), satu query lewat index (is_active, time):
+        alaram sekali jalan, atau alaram berulang yang bit hari ini ada di repeat_days.
+        """
+        moment = moment.astimezone(dt_timezone.utc)
+        start = time(moment.hour, moment.minute)
+        end = time(moment.hour, moment.minute, 59, 999999)
+        return (
+            cls.objects
+            .filter(is_active=True, time__range=(start, end))
+            .annotate(runs_today=F('repeat_days').bitand(1 << moment.weekday()))
+            .filter(Q(repeat_days=0) | Q(runs_today__gt=0))
+            .select_related('group__modul')
+        )
+
+    def next_run_after(self, moment):
+        """Waktu bunyi berikutnya (UTC) setelah `moment`, None jika alaram tidak aktif."""
+        if not self.is_active:
+            return None
+        moment = moment.astimezone(dt_timezone.utc)
+        for offset in range(8):
+            day = moment.date() + timedelta(days=offset)
+            run_at = datetime.combine(day, self.time.replace(microsecond=0), tzinfo=dt_timezone.utc)
+            if run_at > moment and self.runs_on(day.weekday()):
+                return run_at
+        return None
\ No newline at end of file
@@ -10,8 +10,9 @@ class AlarmSerializer(serializers.ModelSerializer):
             'id', 'group', 'label','duration', 'time', 'is_active',
             'repeat_monday', 'repeat_tuesday', 'repeat_wednesday',
             'repeat_thursday', 'repeat_friday', 'repeat_saturday', 'repeat_sunday',
-            'created_at', 'updated_at'
+            'repeat_days', 'created_at', 'updated_at'
         ]
+        read_only_fields = ['repeat_days']
 
 
 class GroupScheduleSerializer(serializers.ModelSerializer):
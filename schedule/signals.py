@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from schedule.models import Alarm
+from schedule.wheel import alarm_wheel
+
+
+@receiver(post_save, sender=Alarm)
+def schedule_alarm(sender, instance, **kwargs):
+    """Alarm dibuat/diubah, hitung ulang waktu bunyinya di wheel setelah transaksi commit."""
+    if settings.ALARM_SCHEDULER != 'wheel':
+        return
+    transaction.on_commit(lambda: alarm_wheel.schedule(instance))
+
+
+@receiver(post_delete, sender=Alarm)
+def unschedule_alarm(sender, instance, **kwargs):
+    """Alarm dihapus (termasuk cascade dari GroupSchedule), keluarkan dari wheel."""
+    if settings.ALARM_SCHEDULER != 'wheel':
+        return
+    alarm_id = instance.id
+    transaction.on_commit(lambda: alarm_wheel.unschedule(alarm_id))
@@ -1,58 +1,76 @@
+import asyncio
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from celery import shared_task
+from django.conf import settings
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from schedule.models import Alarm, GroupSchedule
-from iot.models import ModulePin, ModuleLog
+from schedule.wheel import alarm_wheel
+from iot.models import ModuleLog
+from iot.registry import pin_registry
+from smartfarming.utils.mqtt import publish_message, publish_messages
+
+# perintah jadwal lewat MQTT (Modul.command_transport mqtt/both)
+SCHEDULE_TOPIC = "devices/{}/schedule"
 
 logger = logging.getLogger(__name__)
 
+
+def build_alarm_command(alarm, pins, log_id):
+    """Payload perintah alarm ke device (sama untuk websocket dan MQTT)."""
+    check = 0
+    pins_string = ",".join(str(p) for p in pins) # 1,2,3,4,5
+    duration = alarm.duration
+    schedule_id = alarm.group.id
+    sequential = alarm.group.sequential
+    return f"check={check}\nrelay={pins_string}\ntime={duration}\nschedule={schedule_id}\nlog={log_id}\nsequential={sequential}"
+
+
 @shared_task(name="trigger_alarm_task")
 def trigger_alarm_task(alarm_id):
     """
     Tugas Celery yang HANYA dijalankan untuk membunyikan satu alarm.
     """
     try:
-        alarm = Alarm.objects.get(pk=alarm_id)
+        alarm = Alarm.objects.select_related('group__modul').get(pk=alarm_id)
         device_logs = ModuleLog.objects.create(module = alarm.group.modul, schedule= alarm.group, type="schedule", name = alarm.group.name, alarm_at=alarm.time)
-        module_pin = ModulePin.objects.filter(group=alarm.group)
-        pin_list = list(module_pin.values_list('pin', flat=True))
+        # pin milik grup diambil dari pin map (cache), database hanya saat pin berubah
+        pin_list = pin_registry.group_pins(alarm.group.modul_id, alarm.group_id)
 
         if not pin_list:
             logging.warning(f"ALARM TASK: Tidak ada pin yang ditemukan untuk group {alarm.group.id} di alarm {alarm_id}.")
             return
-        
-        pins_string = ",".join(str(p) for p in pin_list) # 1,2,3,4,5
     except Alarm.DoesNotExist:
         logging.exception(f"ALARM TASK: Alarm dengan ID {alarm_id} tidak ditemukan.")
         return
 
-    # Kirim Pesan ke WebSocket
-    channel_layer = get_channel_layer()
-    group_name = f'grup_{alarm.group.modul.serial_id}'
+    modul = alarm.group.modul
+    group_name = f'grup_{modul.serial_id}'
 
     # Payload message yang akan dikirim ke device
-    check = 0
-    pins = pins_string
-    duration = alarm.duration
-    schedule_id = alarm.group.id
-    log_id = device_logs.id
-    sequential = alarm.group.sequential
-
-    message_payload = f"check={check}\nrelay={pins}\ntime={duration}\nschedule={schedule_id}\nlog={log_id}\nsequential={sequential}"
+    message_payload = build_alarm_command(alarm, pin_list, device_logs.id)
     
-    logging.info(f"ALARM TASK: Memicu alarm ID {alarm_id} untuk grup '{group_name}'")
+    logging.info(f"ALARM TASK: Memicu alarm ID {alarm_id} untuk grup '{group_name}' ({modul.command_transport})")
 
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'channel.message',
-            'message': message_payload,
-            'sender_channel_name': 'celery_worker'
-        }
-    )
+    if modul.uses_mqtt:
+        # QoS 1 tanpa retain: broker menyimpan pesan untuk perangkat dengan persistent session sampai ia tersambung lagi
+        if not publish_message(SCHEDULE_TOPIC.format(modul.serial_id), message_payload, qos=1):
+            logging.error(f"ALARM TASK: Gagal mengirim alarm ID {alarm_id} lewat MQTT.")
+
+    if modul.uses_websocket:
+        # Kirim Pesan ke WebSocket
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(
+            group_name,
+            {
+                'type': 'channel.message',
+                'message': message_payload,
+                'sender_channel_name': 'celery_worker'
+            }
+        )
 
     if not alarm.is_repeating:
         alarm.is_active = False
@@ -62,6 +80,85 @@ def trigger_alarm_task(alarm_id):
     logging.info(f"ALARM TASK: Selesai memicu alarm ID {alarm_id}.")
 
 
+def dispatch_alarms(alarms):
+    """
+    Bunyikan banyak alarm sekaligus (ALARM_DISPATCH = "batch") dengan jumlah query tetap:
+    pin map semua modul (cache, maks. satu query), satu bulk_create ModuleLog dan satu UPDATE
+    untuk alarm sekali jalan. Perintah websocket dikirim satu pesan channel layer per modul
+    (lihat DeviceAuthConsumer.channel_message). `alarms` sudah select_related('group__modul').
+    Mengembalikan jumlah alarm yang perintahnya dikirim.
+    """
+    if not alarms:
+        return 0
+
+    pin_maps = pin_registry.pin_maps(alarm.group.modul_id for alarm in alarms)
+    logs = ModuleLog.objects.bulk_create([
+        ModuleLog(module=alarm.group.modul, schedule=alarm.group, type="schedule", name=alarm.group.name, alarm_at=alarm.time)
+        for alarm in alarms
+    ])
+
+    websocket_messages = defaultdict(list)
+    mqtt_messages = []
+    mqtt_alarm_ids = []
+    one_shot_ids = []
+    fired = 0
+    for alarm, device_logs in zip(alarms, logs):
+        modul = alarm.group.modul
+        pin_list = pin_registry.group_pins(modul.id, alarm.group_id, pins=pin_maps[modul.id])
+        if not pin_list:
+            logging.warning(f"ALARM TASK: Tidak ada pin yang ditemukan untuk group {alarm.group.id} di alarm {alarm.id}.")
+            continue
+
+        message_payload = build_alarm_command(alarm, pin_list, device_logs.id)
+        if modul.uses_mqtt:
+            mqtt_messages.append((SCHEDULE_TOPIC.format(modul.serial_id), message_payload))
+            mqtt_alarm_ids.append(alarm.id)
+        if modul.uses_websocket:
+            websocket_messages[f'grup_{modul.serial_id}'].append(message_payload)
+        if not alarm.is_repeating:
+            one_shot_ids.append(alarm.id)
+        fired += 1
+
+    if websocket_messages:
+        async_to_sync(send_alarm_commands)(websocket_messages)
+    if mqtt_messages:
+        # semua perintah di-publish dulu, PUBACK ditunggu bersama (satu batas MQTT_PUBLISH_TIMEOUT)
+        for alarm_id, published in zip(mqtt_alarm_ids, publish_messages(mqtt_messages, qos=1)):
+            if not published:
+                logging.error(f"ALARM TASK: Gagal mengirim alarm ID {alarm_id} lewat MQTT.")
+    if one_shot_ids:
+        Alarm.objects.filter(id__in=one_shot_ids).update(is_active=False)
+        if settings.ALARM_SCHEDULER == 'wheel':
+            # update() tidak memicu signal post_save, keluarkan dari wheel secara langsung
+            alarm_wheel.unschedule(*one_shot_ids)
+
+    logging.info(
+        f"ALARM TASK: {fired} dari {len(alarms)} alarm dipicu ({len(websocket_messages)} modul websocket), "
+        f"{len(one_shot_ids)} alarm sekali jalan dinonaktifkan."
+    )
+    return fired
+
+
+async def send_alarm_commands(messages_by_group):
+    """Kirim perintah alarm ke grup websocket modul secara bersamaan, satu event per modul."""
+    channel_layer = get_channel_layer()
+    await asyncio.gather(*(
+        channel_layer.group_send(group_name, {
+            'type': 'channel.message',
+            'messages': messages,
+            'sender_channel_name': 'celery_worker'
+        })
+        for group_name, messages in messages_by_group.items()
+    ))
+
+
+@shared_task(name="dispatch_alarms_task")
+def dispatch_alarms_task(alarm_ids):
+    """Versi task dari dispatch_alarms untuk scheduler wheel (satu task per tick)."""
+    alarms = list(Alarm.objects.filter(id__in=alarm_ids, is_active=True).select_related('group__modul'))
+    dispatch_alarms(alarms)
+
+
 @shared_task(name="check_and_run_due_alarms")
 def check_and_run_due_alarms():
     """
@@ -69,33 +166,21 @@ def check_and_run_due_alarms():
     Tugas ini akan mencari semua alarm yang jatuh tempo 'sekarang'
     dan mengirimkannya ke worker.
     """
+    if settings.ALARM_SCHEDULER == 'wheel':
+        # alarm dijalankan oleh manage.py run_alarm_scheduler (schedule/wheel.py)
+        return
+
     now = datetime.now(ZoneInfo("UTC"))
-    current_day_index = now.weekday()  # Senin=0, ..., Minggu=6
-    
-    # Ambil semua alarm yang aktif dan waktunya cocok dengan jam dan menit saat ini
-    alarms_due_now = Alarm.objects.filter(
-        is_active=True,
-        time__hour=now.hour,
-        time__minute=now.minute
-    )
 
-    logging.info(f"BEAT CHECKER ({now.strftime('%H:%M')}): Menemukan {alarms_due_now.count()} alarm yang cocok dengan waktu.")
+    # Satu query (index is_active, time): alarm sekali jalan atau alarm berulang yang dijadwalkan hari ini
+    alarms_due_now = list(Alarm.due_at(now))
 
-    for alarm in alarms_due_now:
-        # Cek apakah alarm dijadwalkan untuk hari ini
-        days_map = [
-            alarm.repeat_monday, alarm.repeat_tuesday, alarm.repeat_wednesday,
-            alarm.repeat_thursday, alarm.repeat_friday, alarm.repeat_saturday,
-            alarm.repeat_sunday
-        ]
-        should_run_today = days_map[current_day_index]
-
-        # Jika alarm ini seharusnya berulang tapi hari ini bukan jadwalnya, lewati.
-        if alarm.is_repeating and not should_run_today:
-            continue
+    logging.info(f"BEAT CHECKER ({now.strftime('%H:%M')}): Menemukan {len(alarms_due_now)} alarm yang jatuh tempo.")
 
-        # Jika lolos dari pengecekan di atas, berarti alarm boleh dijalankan:
-        # - Entah karena ini alarm sekali jalan (is_repeating = False)
-        # - Entah karena ini alarm berulang dan hari ini adalah jadwalnya
+    if settings.ALARM_DISPATCH == 'batch':
+        dispatch_alarms(alarms_due_now)
+        return
+
+    for alarm in alarms_due_now:
         logging.info(f"BEAT CHECKER: Mengirim tugas untuk Alarm ID {alarm.id} ke worker.")
-        trigger_alarm_task.delay(alarm.id)
\ No newline at end of file
+        trigger_alarm_task.delay(alarm.id)
@@ -6,6 +6,7 @@ from rest_framework.permissions import IsAuthenticated
 from smartfarming.utils.exc_handler import CustomResponse
 from smartfarming.utils.permissions import *
 from iot.models import Modul
+from iot.registry import feature_registry
 from .models import *
 from .serializers import *
 
@@ -33,7 +34,7 @@ class AlarmListCreateAPIView(APIView):
             return CustomResponse(message="Anda tidak mempunyai modul ini", status=status.HTTP_403_FORBIDDEN, request=request)
         
         # Cek apakah modul memiliki feature bernama 'schedule'
-        if not group.modul.feature.filter(name__iexact='schedule').exists():
+        if not feature_registry.module_has_feature(group.modul_id, 'schedule'):
             return CustomResponse(message="Modul ini tidak memiliki fitur 'schedule'.", data=None, status=status.HTTP_403_FORBIDDEN, request=request)
         
         serializer = AlarmSerializer(data=request.data)
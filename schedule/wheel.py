@@ -0,0 +1,112 @@
+"""
+Penjadwal alaram berbasis timing wheel (ALARM_SCHEDULER = "wheel").
+Waktu bunyi berikutnya setiap alaram aktif disimpan di redis:
+- schedule:alarm-wheel (sorted set) -> member alarm_id, score waktu bunyi berikutnya (unix epoch)
+Scheduler (manage.py run_alarm_scheduler) hanya mengambil entri yang sudah jatuh tempo, jadi biaya per tick
+sebanding dengan jumlah alaram yang berbunyi, bukan jumlah seluruh alaram.
+Entri diperbarui saat Alarm disimpan/dihapus (schedule/signals.py) dan dibangun ulang saat scheduler mulai.
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from smartfarming.utils.redis import get_redis
+from schedule.models import Alarm
+
+logger = logging.getLogger(__name__)
+
+KEY = "schedule:alarm-wheel"
+
+
+class AlarmWheel:
+
+    def __init__(self, key=KEY):
+        self.key = key
+
+    def schedule(self, alarm, now=None):
+        """Hitung ulang waktu bunyi alaram, dihapus dari wheel jika alaram tidak aktif."""
+        run_at = alarm.next_run_after(now or datetime.now(dt_timezone.utc))
+        try:
+            if run_at is None:
+                get_redis().zrem(self.key, alarm.id)
+            else:
+                get_redis().zadd(self.key, {alarm.id: run_at.timestamp()})
+        except Exception as e:
+            logger.error(f"ALARM WHEEL: Gagal menjadwalkan alarm ID {alarm.id}: {e}")
+
+    def unschedule(self, *alarm_ids):
+        try:
+            get_redis().zrem(self.key, *alarm_ids)
+        except Exception as e:
+            logger.error(f"ALARM WHEEL: Gagal menghapus alarm ID {', '.join(map(str, alarm_ids))}: {e}")
+
+    def rebuild(self):
+        """Bangun ulang wheel dari semua alaram aktif (saat scheduler mulai). Mengembalikan jumlah alaram terjadwal."""
+        now = datetime.now(dt_timezone.utc)
+        entries = {}
+        for alarm in Alarm.objects.filter(is_active=True).iterator(chunk_size=2000):
+            run_at = alarm.next_run_after(now)
+            if run_at is not None:
+                entries[alarm.id] = run_at.timestamp()
+
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.delete(self.key)
+        if entries:
+            pipe.zadd(self.key, entries)
+        pipe.execute()
+        return len(entries)
+
+    def seconds_until_next(self, now):
+        """Detik sampai entri terdekat jatuh tempo (0 jika sudah lewat), None jika wheel kosong."""
+        first = get_redis().zrange(self.key, 0, 0, withscores=True)
+        if not first:
+            return None
+        return max(first[0][1] - now, 0.0)
+
+    def pop_due(self, now):
+        """Ambil lalu hapus semua entri dengan waktu bunyi <= now secara atomik -> [(alarm_id, waktu bunyi)]."""
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.zrangebyscore(self.key, "-inf", now, withscores=True)
+        pipe.zremrangebyscore(self.key, "-inf", now)
+        due, _ = pipe.execute()
+        return [(int(member), score) for member, score in due]
+
+    def fire_due(self, now=None):
+        """
+        Jalankan alaram yang jatuh tempo lalu jadwalkan ulang alaram berulang.
+        Alaram yang terlambat lebih dari ALARM_WHEEL_MAX_DELAY (misal scheduler mati) dilewati.
+        Mengembalikan jumlah alaram yang dikirim ke worker.
+        """
+        from schedule.tasks import trigger_alarm_task, dispatch_alarms_task
+
+        now = time.time() if now is None else now
+        due = self.pop_due(now)
+        if not due:
+            return 0
+
+        run_at_map = dict(due)
+        alarms = Alarm.objects.filter(id__in=run_at_map, is_active=True)
+        fire_ids = []
+        for alarm in alarms:
+            run_at = run_at_map[alarm.id]
+            skipped = now - run_at > settings.ALARM_WHEEL_MAX_DELAY
+            if skipped:
+                logger.warning(f"ALARM WHEEL: Alarm ID {alarm.id} terlambat {now - run_at:.0f} detik, dilewati.")
+            else:
+                fire_ids.append(alarm.id)
+            # alaram sekali jalan juga dijadwalkan ulang: baru dihapus dari wheel setelah task menonaktifkannya,
+            # jika task batal (misal grup tanpa pin) alaram tetap aktif dan dicoba lagi besok (sama dengan mode scan)
+            self.schedule(alarm, now=datetime.fromtimestamp(max(run_at, now), tz=dt_timezone.utc))
+
+        if fire_ids and settings.ALARM_DISPATCH == 'batch':
+            # satu task untuk semua alaram yang jatuh tempo pada tick ini
+            logger.info(f"ALARM WHEEL: Mengirim {len(fire_ids)} alarm ke worker dalam satu tugas.")
+            dispatch_alarms_task.delay(fire_ids)
+        else:
+            for alarm_id in fire_ids:
+                logger.info(f"ALARM WHEEL: Mengirim tugas untuk Alarm ID {alarm_id} ke worker.")
+                trigger_alarm_task.delay(alarm_id)
+        return len(fire_ids)
+
+
+alarm_wheel = AlarmWheel()
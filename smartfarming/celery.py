@@ -14,4 +14,8 @@ app.conf.beat_schedule = {
         'task': 'check_and_run_due_alarms',
         'schedule': crontab(minute='*'),
     },
+    'flush-device-presence': {
+        'task': 'flush_device_presence',
+        'schedule': 30.0, # detik, harus lebih kecil dari DEVICE_PRESENCE_TIMEOUT
+    },
 }
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Helper bersama untuk command benchmark (file berawalan _ tidak dianggap command oleh Django).
+Benchmark selalu berjalan di database test sementara, bukan database utama.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from iot.models import Modul, ModulePin, Feature
+from iot.ingest import SENSOR_FEATURES
+
+PINS_PER_MODULE = 16
+
+
+@contextmanager
+def benchmark_database():
+    """Membuat database test sementara lalu menghapusnya setelah benchmark selesai."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_modules(count, pins_per_module=PINS_PER_MODULE):
+    """Membuat feature sensor dan `count` modul lengkap dengan pin-nya."""
+    features = [
+        Feature.objects.get_or_create(name=name, defaults={'descriptions': name})[0]
+        for name in list(SENSOR_FEATURES.values()) + ['schedule']
+    ]
+    moduls = Modul.objects.bulk_create([Modul(type='benchmark', name=f'bench-{i}') for i in range(count)])
+    # bulk_create tidak mengembalikan pk di semua backend, ambil ulang dari database
+    moduls = list(Modul.objects.filter(type='benchmark').order_by('id'))
+    ModulePin.objects.bulk_create([
+        ModulePin(module=modul, pin=pin, name=f'relay {pin}')
+        for modul in moduls for pin in range(1, pins_per_module + 1)
+    ])
+    for modul in moduls:
+        modul.feature.set(features)
+    return moduls
+
+
+def make_frame(modul, pins_per_module=PINS_PER_MODULE, rng=random, control=True):
+    """Frame perangkat tipikal: semua sensor + status relay (control=False -> sensor saja / frame telemetry)."""
+    frame = {
+        "device": str(modul.auth_id),
+        "temperature_data": [{"name": "suhu", "data": round(rng.uniform(20, 35), 1)}],
+        "humidity_data": [{"name": "kelembapan", "data": rng.randint(40, 90)}],
+        "battery_data": [{"name": "baterai", "data": rng.randint(10, 100)}],
+        "water_level_data": [{"name": "air", "data": rng.randint(0, 100)}],
+    }
+    if control:
+        frame["schedule_data"] = [{"pins": [{str(pin): rng.choice(["0", "1"])} for pin in range(1, pins_per_module + 1)]}]
+    return frame
+
+
+class QueryCounter:
+    """
+    Menghitung query SQL di semua koneksi database (termasuk koneksi thread pool & flusher buffer).
+    Wrapper dipasang ke koneksi yang sudah terbuka dan setiap koneksi baru lewat signal connection_created.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        """Mulai hitung dari nol, misal setelah fase persiapan (koneksi tetap terpasang)."""
+        with self._lock:
+            self.count = 0
+
+    def _install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        for conn in connections.all(initialized_only=True):
+            self._install(None, conn)
+        connection_created.connect(self._install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self._install)
+        for conn in connections.all(initialized_only=True):
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+def percentile(values, percent):
+    """Persentil sederhana (nearest-rank), 0.0 jika tidak ada data."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
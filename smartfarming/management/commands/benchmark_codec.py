@@ -0,0 +1,46 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from uuid6 import uuid7
+from iot.codec import available_encodings, encode_frame, decode_frame, JSON
+from iot.models import Modul
+from ._benchmark import make_frame
+
+
+class Command(BaseCommand):
+    help = 'Membandingkan ukuran dan biaya decode frame perangkat untuk JSON, MessagePack dan CBOR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='Jumlah decode per encoding')
+        parser.add_argument('--json', action='store_true', help='Tampilkan hasil dalam format JSON')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        # modul tidak disimpan, hanya dipakai untuk membentuk frame
+        frame = make_frame(Modul(auth_id=uuid7()), rng=random.Random(0))
+
+        results = []
+        for encoding in available_encodings():
+            encoded = encode_frame(frame, encoding)
+            if encoding == JSON:
+                decode = lambda: decode_frame(text_data=encoded)
+            else:
+                decode = lambda: decode_frame(bytes_data=encoded, encoding=encoding)
+            assert decode() == frame
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                decode()
+            elapsed = time.perf_counter() - start
+            results.append({
+                "encoding": encoding,
+                "bytes": len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded),
+                "decode_us": elapsed / iterations * 1_000_000,
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(f"{result['encoding']:>8}: {result['bytes']:>5} byte, decode {result['decode_us']:.2f} us/frame")
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from iot import ingest, async_ingest
+from iot.buffers import flush_sensor_buffers
+from ._benchmark import benchmark_database, seed_modules, make_frame
+
+
+class Command(BaseCommand):
+    help = 'Membandingkan frames/detik jalur penyimpanan frame sync (thread hop) vs ORM async'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=10, help='Jumlah perangkat simulasi yang mengirim bersamaan')
+        parser.add_argument('--frames', type=int, default=100, help='Jumlah frame per perangkat')
+        parser.add_argument('--json', action='store_true', help='Tampilkan hasil dalam format JSON')
+
+    def handle(self, *args, **options):
+        # log per frame akan mendominasi waktu benchmark, error dihitung dari hasil frame
+        logging.disable(logging.ERROR)
+        try:
+            with benchmark_database():
+                moduls = seed_modules(options['devices'])
+                results = [
+                    self.run_path('thread', moduls, options['frames']),
+                    self.run_path('async', moduls, options['frames']),
+                ]
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['path']:>7}: {result['frames']} frame dalam {result['seconds']:.2f} s "
+                f"-> {result['frames_per_second']:.1f} frame/s ({result['errors']} error)"
+            )
+
+    def run_path(self, path, moduls, frames_per_device):
+        if path == 'async':
+            persist = async_ingest.apersist_device_frame
+        else:
+            persist = database_sync_to_async(ingest.persist_device_frame)
+
+        errors = 0
+
+        async def device(modul):
+            nonlocal errors
+            rng = random.Random(modul.id)
+            for _ in range(frames_per_device):
+                result = await persist(modul, make_frame(modul, rng=rng))
+                errors += len(result["errors"])
+
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(*(device(modul) for modul in moduls))
+            return time.perf_counter() - start
+
+        seconds = asyncio.run(run())
+        flush_sensor_buffers()
+        frames = frames_per_device * len(moduls)
+        return {
+            "path": path,
+            "devices": len(moduls),
+            "frames": frames,
+            "seconds": seconds,
+            "errors": errors,
+            "frames_per_second": frames / seconds if seconds else 0.0,
+        }
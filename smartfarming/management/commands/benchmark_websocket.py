@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from iot.buffers import flush_sensor_buffers, sensor_buffer_stats
+from iot.outbound import outbound_queue_stats
+from smartfarming.routing import websocket_urlpatterns
+from smartfarming.utils.redis import get_redis, reset_redis_clients
+from ._benchmark import benchmark_database, seed_modules, make_frame, QueryCounter, percentile
+
+# channel layer & cache in-memory agar benchmark hanya mengukur consumer dan database.
+# Presence, state & gate telemetry tetap lewat redis, tapi di REDIS_DB terpisah (--redis-db): id modul benchmark
+# berasal dari database sementara dan bisa sama dengan modul asli (flush_device_presence akan menimpanya).
+BENCHMARK_SETTINGS = {
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark jalur ingest websocket: N perangkat & M user per modul lewat DeviceAuthConsumer. '
+        'Melaporkan frame/s, latensi receive->broadcast, query per frame dan saturasi thread pool. '
+        'Mode telemetry (default) melewati governor & delta state sehingga butuh redis yang bisa dihubungi.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=10, help='Jumlah perangkat simulasi')
+        parser.add_argument('--users', type=int, default=2, help='Jumlah user yang subscribe per modul')
+        parser.add_argument('--frames', type=int, default=100, help='Jumlah frame per perangkat')
+        parser.add_argument('--interval', type=float, default=0, help='Jeda antar frame per perangkat (ms)')
+        parser.add_argument('--ingest', choices=['thread', 'async'], default='thread', help='Jalur penyimpanan frame (IOT_INGEST_ASYNC)')
+        parser.add_argument(
+            '--frame', choices=['telemetry', 'control'], default='telemetry',
+            help='telemetry = sensor saja, diterima user sebagai telemetry.delta (butuh redis); '
+                 'control = dengan schedule_data, diteruskan apa adanya',
+        )
+        parser.add_argument('--redis-db', type=int, default=15, help='Database redis untuk presence & state telemetry benchmark (bukan REDIS_DB aplikasi)')
+        parser.add_argument('--output', default=None, help='File hasil JSON (default benchmark_websocket_<waktu>.json)')
+
+    def handle(self, *args, **options):
+        if options['redis_db'] == settings.REDIS_DB:
+            raise CommandError(f"--redis-db tidak boleh sama dengan REDIS_DB aplikasi ({settings.REDIS_DB}).")
+
+        # log per frame akan mendominasi waktu benchmark
+        logging.disable(logging.ERROR)
+        try:
+            with override_settings(IOT_INGEST_ASYNC=options['ingest'] == 'async', REDIS_DB=options['redis_db'], **BENCHMARK_SETTINGS):
+                # client redis di-cache per proses, buat ulang dengan REDIS_DB benchmark
+                reset_redis_clients()
+                if options['frame'] == 'telemetry':
+                    # tanpa redis diff state gagal dan tidak ada delta yang sampai ke user
+                    try:
+                        get_redis().ping()
+                    except Exception as e:
+                        raise CommandError(f"Mode telemetry butuh redis (state & gate telemetry): {e}. Gunakan --frame control tanpa redis.")
+                with benchmark_database():
+                    moduls = seed_modules(options['devices'])
+                    members = self.seed_users(moduls, options['users'])
+                    # counter dipasang sebelum koneksi dibuka agar koneksi thread pool & flusher ikut terhitung
+                    with QueryCounter() as queries:
+                        result = asyncio.run(self.run(moduls, members, options, queries))
+                    result["db_queries_per_frame"] = result["db_queries"] / result["frames"] if result["frames"] else 0.0
+        finally:
+            reset_redis_clients()
+            logging.disable(logging.NOTSET)
+
+        result["params"] = {key: options[key] for key in ('devices', 'users', 'frames', 'interval', 'ingest', 'frame', 'redis_db')}
+        result["created_at"] = timezone.now().isoformat()
+        output = options['output'] or f"benchmark_websocket_{timezone.now():%Y%m%d_%H%M%S}.json"
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+        self.stdout.write(
+            f"{result['frames']} frame dalam {result['seconds']:.2f} s -> {result['frames_per_second']:.1f} frame/s\n"
+            f"latensi p50 {result['latency_ms']['p50']:.2f} ms, p99 {result['latency_ms']['p99']:.2f} ms "
+            f"({result['deliveries']}/{result['expected_deliveries']} frame diterima user lewat {result['messages']} pesan)\n"
+            f"query database {result['db_queries_per_frame']:.2f} per frame\n"
+            f"tunggu thread pool p50 {result['executor_wait_ms']['p50']:.2f} ms, p99 {result['executor_wait_ms']['p99']:.2f} ms\n"
+            f"antrian kirim {result['outbound_queue']['queued']} pesan, {result['outbound_queue']['dropped']} dibuang, "
+            f"kedalaman maks {result['outbound_queue']['max_depth']}\n"
+            f"hasil disimpan di {output}"
+        )
+
+    def seed_users(self, moduls, users_per_module):
+        members = {}
+        for modul in moduls:
+            users = [User.objects.create(username=f'bench-{modul.id}-{i}') for i in range(users_per_module)]
+            modul.user.add(*users)
+            members[modul.id] = users
+        return members
+
+    async def run(self, moduls, members, options, queries):
+        app = URLRouter(websocket_urlpatterns)
+        frames_per_device = options['frames']
+        interval = options['interval'] / 1000
+        control = options['frame'] == 'control'
+        # frame kontrol diteruskan apa adanya, telemetry dikirim sebagai delta (bisa menggabungkan beberapa frame)
+        marker = '"schedule_data"' if control else '"telemetry.delta"'
+        sent_at = {}
+        latencies = []
+        deliveries = 0
+        messages = 0
+
+        async def connect(modul, user=None):
+            communicator = WebsocketCommunicator(app, f"/ws/device/{modul.serial_id}/")
+            # autentikasi JWT tidak diukur, user langsung dipasang di scope
+            communicator.scope['user'] = user or AnonymousUser()
+            connected, _ = await communicator.connect()
+            assert connected, f"gagal terhubung ke modul {modul.serial_id}"
+            return communicator
+
+        async def device(modul, communicator):
+            rng = random.Random(modul.id)
+            for index in range(frames_per_device):
+                frame = make_frame(modul, rng=rng, control=control)
+                if not control:
+                    # key khusus benchmark, ikut masuk delta sehingga terlihat frame terbaru yang tercakup
+                    frame["benchmark_frame"] = index
+                sent_at[modul.id, index] = time.perf_counter()
+                await communicator.send_to(text_data=json.dumps(frame))
+                if interval:
+                    await asyncio.sleep(interval)
+
+        async def subscriber(modul, communicator):
+            nonlocal deliveries, messages
+            index = 0
+            while index < frames_per_device:
+                try:
+                    message = await communicator.receive_from(timeout=30)
+                except asyncio.TimeoutError:
+                    return
+                if marker not in message:
+                    continue
+                now = time.perf_counter()
+                messages += 1
+                # satu delta mencakup semua frame sejak pesan sebelumnya sampai benchmark_frame (digabung governor)
+                covered = index + 1 if control else json.loads(message)["changes"]["benchmark_frame"] + 1
+                for frame_index in range(index, covered):
+                    latencies.append((now - sent_at[modul.id, frame_index]) * 1000)
+                deliveries += covered - index
+                index = covered
+
+        executor_waits = []
+        stop = asyncio.Event()
+
+        async def probe():
+            # waktu tunggu no-op di executor yang dipakai database_sync_to_async = saturasi thread pool
+            noop = database_sync_to_async(lambda: None)
+            while not stop.is_set():
+                start = time.perf_counter()
+                await noop()
+                executor_waits.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        devices = {modul.id: await connect(modul) for modul in moduls}
+        users = {
+            modul.id: [await connect(modul, user) for user in members[modul.id]]
+            for modul in moduls
+        }
+        for communicator in list(devices.values()) + [c for group in users.values() for c in group]:
+            await communicator.receive_from()  # status "Connected to Websocket"
+
+        # query handshake (get_modul, keanggotaan user) tidak dihitung, hanya query akibat frame
+        queries.reset()
+        probe_task = asyncio.ensure_future(probe())
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(device(modul, devices[modul.id]) for modul in moduls),
+            *(subscriber(modul, communicator) for modul in moduls for communicator in users[modul.id]),
+        )
+        seconds = time.perf_counter() - start
+        stop.set()
+        await probe_task
+        # sisa isi write-behind buffer juga akibat frame, query saat disconnect tidak dihitung
+        await database_sync_to_async(flush_sensor_buffers)()
+        db_queries = queries.count
+        buffers = sensor_buffer_stats()
+
+        for communicator in list(devices.values()) + [c for group in users.values() for c in group]:
+            await communicator.disconnect()
+
+        frames = frames_per_device * len(moduls)
+        return {
+            "frames": frames,
+            "seconds": seconds,
+            "frames_per_second": frames / seconds if seconds else 0.0,
+            "deliveries": deliveries,
+            "messages": messages,
+            "db_queries": db_queries,
+            "outbound_queue": outbound_queue_stats(),
+            "sensor_buffers": buffers,
+            "expected_deliveries": frames * options['users'],
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies, default=0.0),
+            },
+            "executor_wait_ms": {
+                "p50": percentile(executor_waits, 50),
+                "p99": percentile(executor_waits, 99),
+                "max": max(executor_waits, default=0.0),
+            },
+        }
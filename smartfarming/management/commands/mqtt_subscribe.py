@@ -1,56 +1,78 @@
-import json
-from django.core.management.base import BaseCommand
+import logging
+import multiprocessing
+import signal
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-import paho.mqtt.client as mqtt
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.db import connections
+from iot.mqtt_ingest import MqttIngestWorker
 
-class Command(BaseCommand):
-    help = 'Starts the MQTT client to subscribe to topics'
+logger = logging.getLogger(__name__)
 
-    def handle(self, *args, **kwargs):
-        client = mqtt.Client()
-        client.on_connect = self.on_connect
-        client.on_message = self.on_message
+class Command(BaseCommand):
+    help = 'Menjalankan ingest MQTT: frame perangkat disimpan lalu di-broadcast ke grup websocket grup_<serial_id>'
 
-        self.stdout.write(self.style.SUCCESS("Connecting to MQTT broker..."))
-        client.connect(
-            settings.MQTT_BROKER_HOST,
-            settings.MQTT_BROKER_PORT,
-            settings.MQTT_KEEPALIVE
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Jumlah proses subscriber (lebih dari 1 membutuhkan shared subscription)')
+        parser.add_argument(
+            '--share-group', default=settings.MQTT_SHARE_GROUP or None,
+            help='Nama grup shared subscription MQTT v5 ($share/<group>/...), broker membagi pesan ke anggota grup',
         )
 
-        # loop_forever() adalah blocking call, ia akan berjalan terus
-        # sampai program dihentikan.
-        client.loop_forever()
+    def handle(self, *args, **options):
+        workers = options['workers']
+        share_group = options['share_group']
+        if workers < 1:
+            raise CommandError('--workers minimal 1')
+        if workers > 1 and not share_group:
+            # tanpa shared subscription setiap proses menerima semua pesan (disimpan berkali-kali)
+            raise CommandError('--workers lebih dari 1 membutuhkan --share-group (atau MQTT_SHARE_GROUP)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Connecting to MQTT broker {settings.MQTT_BROKER_HOST}:{settings.MQTT_BROKER_PORT} "
+            f"({workers} worker, share group: {share_group or '-'})..."
+        ))
+        if workers == 1:
+            self.run_worker(0, share_group)
+            return
 
-    def on_connect(self, client, userdata, flags, rc):
-        """Callback yang dipanggil saat berhasil terhubung ke broker."""
-        if rc == 0:
-            self.stdout.write(self.style.SUCCESS("Successfully connected to MQTT broker."))
-            client.subscribe("devices/+/status")
-            self.stdout.write(self.style.SUCCESS("Subscribed to topic: devices/+/status"))
-        else:
-            self.stdout.write(self.style.ERROR(f"Failed to connect, return code {rc}\n"))
+        # koneksi database tidak boleh dipakai bersama proses anak
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self.run_worker, args=(index, share_group), name=f"mqtt-ingest-{index}")
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
 
-    def on_message(self, client, userdata, msg):
-        self.stdout.write(f"MQTT> Received message on topic {msg.topic}: {msg.payload.decode()}")
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
 
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop(None, None)
+            for process in processes:
+                process.join()
+
+    def run_worker(self, index, share_group):
+        worker = MqttIngestWorker(
+            settings.MQTT_BROKER_HOST,
+            settings.MQTT_BROKER_PORT,
+            settings.MQTT_KEEPALIVE,
+            shared_group=share_group,
+            name=f"mqtt-ingest-{index}",
+        )
         try:
-            data = json.loads(msg.payload.decode())
-            device_id = msg.topic.split('/')[1]
-            group_name = f'device_{device_id}'
-
-            # Dapatkan channel layer
-            channel_layer = get_channel_layer()
-
-            # Kirim data ke grup WebSocket yang sesuai
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    'type': 'device.message', # Ini akan memanggil method device_message di consumer
-                    'message': data
-                }
+            worker.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            logger.info(
+                f"MQTT> {worker.name} berhenti: {worker.received} diterima, "
+                f"{worker.processed} diproses, {worker.dropped} dibuang."
             )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"An error occurred: {e}"))
\ No newline at end of file
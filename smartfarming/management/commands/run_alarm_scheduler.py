@@ -0,0 +1,36 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from schedule.wheel import alarm_wheel
+
+logger = logging.getLogger(__name__)
+
+# jeda maksimum antar pemeriksaan, agar alarm baru yang lebih dekat dari entri terdekat tetap terlihat
+MAX_SLEEP = 1.0
+# jeda setelah redis/database gagal sebelum mencoba lagi
+ERROR_SLEEP = 5.0
+
+
+class Command(BaseCommand):
+    help = 'Menjalankan scheduler alarm berbasis timing wheel (ALARM_SCHEDULER=wheel), pengganti pemeriksaan alarm per menit'
+
+    def handle(self, *args, **options):
+        if settings.ALARM_SCHEDULER != 'wheel':
+            # pemeriksaan per menit (check_and_run_due_alarms) juga berjalan, alarm akan terkirim dua kali
+            raise CommandError("Set ALARM_SCHEDULER=wheel sebelum menjalankan scheduler ini.")
+
+        count = alarm_wheel.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Alarm scheduler berjalan, {count} alarm aktif terjadwal."))
+
+        while True:
+            try:
+                # proses ini berjalan lama, buang koneksi database yang sudah kadaluarsa
+                close_old_connections()
+                alarm_wheel.fire_due()
+                wait = alarm_wheel.seconds_until_next(time.time())
+            except Exception as e:
+                logger.exception(f"ALARM WHEEL: Error pada scheduler: {e}")
+                wait = ERROR_SLEEP
+            time.sleep(MAX_SLEEP if wait is None else min(wait, MAX_SLEEP))
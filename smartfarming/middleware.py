@@ -1,15 +1,32 @@
 from channels.middleware import BaseMiddleware
 from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.models import TokenUser
 from django.contrib.auth.models import AnonymousUser, User
 from channels.db import database_sync_to_async
 from urllib.parse import parse_qs
+from smartfarming.utils.user_cache import aget_cached_user, aset_cached_user
 
 @database_sync_to_async
-def get_user(user_id):
+def get_user_from_db(user_id):
     try:
         return User.objects.get(id=user_id)
     except User.DoesNotExist:
+        return None
+
+async def get_user(user_id):
+    """
+    Ambil user dari cache dulu, database hanya saat cache kosong.
+    Reconnect berulang dengan token baru tidak lagi menjadi query database.
+    """
+    user = await aget_cached_user(user_id)
+    if user is None:
+        user = await get_user_from_db(user_id)
+        if user is None:
+            return AnonymousUser()
+        await aset_cached_user(user)
+    if not user.is_active:
         return AnonymousUser()
+    return user
 
 class JwtAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -17,6 +34,8 @@ class JwtAuthMiddleware(BaseMiddleware):
         query_string = scope.get('query_string', b'').decode('utf-8')
         query_params = parse_qs(query_string)
         token = query_params.get('token', [None])[0]
+        # ?mode=readonly -> koneksi hanya menerima pesan (dashboard), user dari claim token tanpa database
+        read_only = query_params.get('mode', [None])[0] == 'readonly'
 
         # Jika tidak ada di query string, cari di header (untuk Postman/client non-browser)
         if not token:
@@ -29,12 +48,17 @@ class JwtAuthMiddleware(BaseMiddleware):
             try:
                 # Validasi token
                 access_token = AccessToken(token)
-                # Ambil user dari database
-                scope['user'] = await get_user(user_id=access_token['user_id'])
+                if read_only:
+                    # User ringan dari claim token, tanpa akses database.
+                    # Hanya id yang bisa dipercaya, field lain (username, is_staff) diambil dari claim jika ada.
+                    scope['user'] = TokenUser(access_token)
+                else:
+                    # Ambil user dari cache / database
+                    scope['user'] = await get_user(user_id=access_token['user_id'])
             except Exception as e:
                 # Token tidak valid atau kedaluwarsa
                 scope['user'] = AnonymousUser()
         else:
             scope['user'] = AnonymousUser()
 
-        return await super().__call__(scope, receive, send)
\ No newline at end of file
+        return await super().__call__(scope, receive, send)
@@ -131,6 +131,11 @@ SIMPLE_JWT = {
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",)
 }
 
+# Cache user untuk autentikasi JWT websocket (smartfarming/utils/user_cache.py), detik
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=300, cast=int) # cache bersama (redis)
+JWT_USER_CACHE_LOCAL_TTL = config('JWT_USER_CACHE_LOCAL_TTL', default=30, cast=int) # cache in-process
+JWT_USER_CACHE_SIZE = config('JWT_USER_CACHE_SIZE', default=10000, cast=int)
+
 # CORS Header tambahan
 CORS_ALLOW_HEADERS = list(default_headers) + ["Authorization"]
 CSRF_TRUSTED_ORIGINS = [
@@ -152,8 +157,25 @@ SESSION_COOKIE_NAME = 'scit_smart_farming'
 MQTT_BROKER_HOST = "localhost"
 MQTT_BROKER_PORT = 1883
 MQTT_KEEPALIVE = 60
+MQTT_PUBLISH_TIMEOUT = config('MQTT_PUBLISH_TIMEOUT', default=5, cast=int) # detik menunggu konfirmasi broker (QoS 1)
+MQTT_SHARE_GROUP = config('MQTT_SHARE_GROUP', default='') # grup shared subscription untuk mqtt_subscribe (kosong = subscribe biasa)
+MQTT_INGEST_QUEUE_SIZE = config('MQTT_INGEST_QUEUE_SIZE', default=1000, cast=int) # pesan yang menunggu diproses per worker, lebih dari ini dibuang
+MQTT_INGEST_BATCH_SIZE = config('MQTT_INGEST_BATCH_SIZE', default=50, cast=int) # pesan yang diambil dari antrian sekaligus
+
+# Keperluan ingest data sensor (write-behind buffer)
+SENSOR_BUFFER_FLUSH_INTERVAL_MS = config('SENSOR_BUFFER_FLUSH_INTERVAL_MS', default=500, cast=int)
+SENSOR_BUFFER_MAX_SIZE = config('SENSOR_BUFFER_MAX_SIZE', default=500, cast=int)
+SENSOR_BUFFER_MAX_RETRIES = config('SENSOR_BUFFER_MAX_RETRIES', default=10, cast=int) # flush gagal per modul sebelum datanya dibuang
+FEATURE_REGISTRY_CHECK_INTERVAL = config('FEATURE_REGISTRY_CHECK_INTERVAL', default=5, cast=int) # detik
+IOT_INGEST_ASYNC = config('IOT_INGEST_ASYNC', default=False, cast=bool) # True = pakai ORM async di DeviceAuthConsumer
+
+# Keperluan presence perangkat (online/offline & last seen), detik
+DEVICE_PRESENCE_TIMEOUT = config('DEVICE_PRESENCE_TIMEOUT', default=180, cast=int) # tanpa pesan selama ini = offline
+DEVICE_PRESENCE_TOUCH_INTERVAL = config('DEVICE_PRESENCE_TOUCH_INTERVAL', default=15, cast=int) # jeda update last seen per koneksi
 
 # Keperluan WebSocket
+TELEMETRY_BROADCAST_MAX_HZ = config('TELEMETRY_BROADCAST_MAX_HZ', default=2, cast=float) # 0 = tanpa batas
+WS_SEND_QUEUE_MAX = config('WS_SEND_QUEUE_MAX', default=100, cast=int) # batas antrian kirim per koneksi, 0 = tanpa batas
 ASGI_APPLICATION = 'smartfarming.asgi.application'
 CHANNEL_LAYERS = {
     'default': {
@@ -204,6 +226,16 @@ LOGGING = {
 REDIS_HOST = config('REDIS_HOST', default='localhost')
 REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 
+REDIS_DB = config('REDIS_DB', default=2, cast=int) # data aplikasi (presence perangkat, state telemetry, jadwal alarm), lihat smartfarming/utils/redis.py
+
+# Cache bersama antar proses (db redis 1, db 0 dipakai celery)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+    }
+}
+
 # KEPERLUAN PENJADWALAN
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
@@ -212,6 +244,9 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_ENABLE_UTC = True
+ALARM_SCHEDULER = config('ALARM_SCHEDULER', default='scan') # scan: beat memeriksa alarm setiap menit, wheel: manage.py run_alarm_scheduler (schedule/wheel.py)
+ALARM_DISPATCH = config('ALARM_DISPATCH', default='task') # task: satu trigger_alarm_task per alarm, batch: satu task per tick untuk semua alarm jatuh tempo
+ALARM_WHEEL_MAX_DELAY = config('ALARM_WHEEL_MAX_DELAY', default=60, cast=int) # detik, alarm yang terlambat lebih dari ini (scheduler mati) dilewati
 
 # Konfigurasi FCM
 FCM_DJANGO_SETTINGS = {
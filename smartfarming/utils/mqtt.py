@@ -1,19 +1,141 @@
+import logging
+import os
+import threading
+import time
 import paho.mqtt.client as mqtt
 from django.conf import settings
 
-def publish_message(topic, payload):
-    """Fungsi untuk mem-publish pesan ke topic MQTT."""
-    try:
-        client = mqtt.Client()
-        client.connect(
-            settings.MQTT_BROKER_HOST,
-            settings.MQTT_BROKER_PORT,
-            settings.MQTT_KEEPALIVE
-        )
-        client.publish(topic, payload)
-        client.disconnect()
-        print(f"Published to {topic}: {payload}")
+logger = logging.getLogger(__name__)
+
+
+class MqttPublisher:
+    """
+    Satu koneksi MQTT yang dipakai bersama oleh semua thread di satu proses.
+    - koneksi dibuka sekali (loop_start), reconnect otomatis oleh thread jaringan paho
+    - publish QoS 1 menunggu PUBACK dari broker paling lama `timeout` detik
+    - dibuat ulang setelah fork (worker celery prefork) karena socket tidak boleh dipakai bersama
+    """
+
+    def __init__(self, host, port, keepalive, timeout=5):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._client = None
+        self._pid = None
+
+    def publish(self, topic, payload, qos=1, retain=False, timeout=None):
+        """Publish satu pesan, mengembalikan True jika diterima broker (QoS 0: jika terkirim ke socket)."""
+        timeout = self.timeout if timeout is None else timeout
+        client = self._get_client()
+        if not self._connected.wait(timeout):
+            logger.error(f"MQTT> Belum terhubung ke broker {self.host}:{self.port}, pesan ke {topic} gagal dikirim.")
+            return False
+
+        info = client.publish(topic, payload, qos=qos, retain=retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            logger.error(f"MQTT> Gagal publish ke {topic}: {mqtt.error_string(info.rc)}")
+            return False
+        if qos > 0:
+            try:
+                info.wait_for_publish(timeout)
+            except (RuntimeError, ValueError) as e:
+                logger.error(f"MQTT> Gagal publish ke {topic}: {e}")
+                return False
+            if not info.is_published():
+                logger.error(f"MQTT> Broker tidak mengonfirmasi pesan ke {topic} dalam {timeout} detik.")
+                return False
         return True
+
+    def publish_many(self, messages, qos=1, retain=False, timeout=None):
+        """
+        Publish banyak pesan [(topic, payload), ...] sekaligus: semua dikirim dulu, lalu konfirmasi broker
+        ditunggu bersama dengan satu batas waktu `timeout` (bukan `timeout` per pesan).
+        Mengembalikan list bool sesuai urutan pesan.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        client = self._get_client()
+        if not self._connected.wait(timeout):
+            logger.error(f"MQTT> Belum terhubung ke broker {self.host}:{self.port}, {len(messages)} pesan gagal dikirim.")
+            return [False] * len(messages)
+
+        infos = []
+        for topic, payload in messages:
+            info = client.publish(topic, payload, qos=qos, retain=retain)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.error(f"MQTT> Gagal publish ke {topic}: {mqtt.error_string(info.rc)}")
+                info = None
+            infos.append(info)
+
+        results = []
+        for (topic, _), info in zip(messages, infos):
+            if info is None:
+                results.append(False)
+                continue
+            if qos > 0:
+                try:
+                    info.wait_for_publish(max(deadline - time.monotonic(), 0))
+                except (RuntimeError, ValueError) as e:
+                    logger.error(f"MQTT> Gagal publish ke {topic}: {e}")
+                    results.append(False)
+                    continue
+                if not info.is_published():
+                    logger.error(f"MQTT> Broker tidak mengonfirmasi pesan ke {topic} dalam {timeout} detik.")
+                    results.append(False)
+                    continue
+            results.append(True)
+        return results
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._connected.clear()
+                client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+                client.on_connect = self._on_connect
+                client.on_disconnect = self._on_disconnect
+                client.reconnect_delay_set(min_delay=1, max_delay=30)
+                client.connect_async(self.host, self.port, self.keepalive)
+                client.loop_start()
+                self._client = client
+                self._pid = os.getpid()
+            return self._client
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"MQTT> Gagal terhubung ke broker: {reason_code}")
+            return
+        self._connected.set()
+        logger.info(f"MQTT> Publisher terhubung ke broker {self.host}:{self.port}")
+
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        self._connected.clear()
+        logger.warning(f"MQTT> Publisher terputus dari broker: {reason_code}, mencoba reconnect...")
+
+
+publisher = MqttPublisher(
+    settings.MQTT_BROKER_HOST,
+    settings.MQTT_BROKER_PORT,
+    settings.MQTT_KEEPALIVE,
+    timeout=settings.MQTT_PUBLISH_TIMEOUT,
+)
+
+
+def publish_message(topic, payload, qos=1, retain=False):
+    """Fungsi untuk mem-publish pesan ke topic MQTT (koneksi dipakai ulang, lihat MqttPublisher)."""
+    try:
+        return publisher.publish(topic, payload, qos=qos, retain=retain)
+    except Exception as e:
+        logger.error(f"MQTT> Failed to publish to MQTT: {e}")
+        return False
+
+
+def publish_messages(messages, qos=1, retain=False):
+    """Publish banyak pesan [(topic, payload), ...] dengan satu batas waktu bersama (lihat MqttPublisher.publish_many)."""
+    try:
+        return publisher.publish_many(messages, qos=qos, retain=retain)
     except Exception as e:
-        print(f"Failed to publish to MQTT: {e}")
-        return False
\ No newline at end of file
+        logger.error(f"MQTT> Failed to publish to MQTT: {e}")
+        return [False] * len(messages)
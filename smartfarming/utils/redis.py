@@ -0,0 +1,49 @@
+import asyncio
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+# timeout pendek, data aplikasi di redis tidak boleh menahan consumer/task terlalu lama
+SOCKET_TIMEOUT = 2
+
+_client = None
+_async_clients = {}
+
+
+def get_redis():
+    """Client redis (sync) bersama untuk data aplikasi, koneksi di-pool per proses."""
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+            socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=SOCKET_TIMEOUT,
+        )
+    return _client
+
+
+def get_async_redis():
+    """
+    Client redis async untuk consumer websocket.
+    Pool koneksi asyncio terikat ke event loop, jadi client dibuat per event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # buang client milik event loop yang sudah ditutup
+        for old_loop in [old for old in _async_clients if old.is_closed()]:
+            del _async_clients[old_loop]
+        client = aioredis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+            socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=SOCKET_TIMEOUT,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset_redis_clients():
+    """Buang client yang sudah dibuat agar client berikutnya memakai settings terbaru (misal REDIS_DB benchmark)."""
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = None
+    _async_clients.clear()
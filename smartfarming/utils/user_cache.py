@@ -0,0 +1,68 @@
+"""
+Cache user untuk autentikasi JWT websocket (lihat smartfarming/middleware.py).
+Dua tingkat cache, keduanya dengan TTL pendek:
+- in-process (cachetools TTLCache) -> tanpa I/O sama sekali
+- cache bersama (django cache/redis) -> dipakai bersama antar proses daphne
+Cache dibersihkan saat User disimpan/dihapus (receiver di profil/models.py). Proses lain bisa
+memegang user lama di cache in-process paling lama JWT_USER_CACHE_LOCAL_TTL detik.
+Yang disimpan hanya field yang dibutuhkan consumer (CACHED_FIELDS), bukan seluruh User (hash password tidak ikut).
+"""
+import logging
+import threading
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY = "auth:jwt-user:{}"
+CACHED_FIELDS = ("id", "username", "is_active")
+
+_local = TTLCache(maxsize=settings.JWT_USER_CACHE_SIZE, ttl=settings.JWT_USER_CACHE_LOCAL_TTL)
+# TTLCache tidak thread-safe, invalidasi bisa datang dari thread request lain
+_lock = threading.Lock()
+
+
+async def aget_cached_user(user_id):
+    """User dari cache (in-process lalu bersama), None jika belum ada."""
+    # claim user_id di token berupa string, pk User berupa int -> satu tipe key untuk semua entry point
+    user_id = int(user_id)
+    with _lock:
+        user = _local.get(user_id)
+    if user is not None:
+        return user
+    try:
+        fields = await cache.aget(KEY.format(user_id))
+    except Exception as e:
+        logger.warning(f"CACHE> Gagal membaca cache user {user_id}: {e}")
+        return None
+    if not isinstance(fields, dict):
+        # kosong, atau entri format lama (objek User lengkap)
+        return None
+    user = User(**fields)
+    with _lock:
+        _local[user_id] = user
+    return user
+
+
+async def aset_cached_user(user):
+    user_id = int(user.pk)
+    fields = {field: getattr(user, field) for field in CACHED_FIELDS}
+    with _lock:
+        _local[user_id] = User(**fields)
+    try:
+        await cache.aset(KEY.format(user_id), fields, timeout=settings.JWT_USER_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"CACHE> Gagal menyimpan cache user {user_id}: {e}")
+
+
+def invalidate_cached_user(user_id):
+    """Hapus user dari kedua tingkat cache (dipanggil saat user disimpan, dinonaktifkan atau dihapus)."""
+    user_id = int(user_id)
+    with _lock:
+        _local.pop(user_id, None)
+    try:
+        cache.delete(KEY.format(user_id))
+    except Exception as e:
+        logger.warning(f"CACHE> Gagal menghapus cache user {user_id}: {e}")